@@ -1,30 +1,51 @@
-import os, threading, asyncio, json
-from flask import Flask, render_template, request, jsonify, abort
+import os, asyncio, json
+from contextlib import asynccontextmanager
+from pathlib import Path
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
 import jwt
+import uvicorn
 from datetime import datetime, timedelta
 from chatbot.database import auth_user, init_db
 from chatbot.mcp.client_sse import InteractiveBankingAssistant
+from chatbot.session_manager import SessionManager
 
-# Initialize Flask app pointing to local templates/ and static/
-app = Flask(__name__, template_folder="templates", static_folder="static")
+BASE_DIR = Path(__file__).parent
 
 # JWT configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 
-# Instantiate & initialize the agent at startup
-assistant = InteractiveBankingAssistant()
+# How long a reply may take, or how long a streamed reply may go quiet
+REPLY_TIMEOUT_SECONDS = 30
 
-# Spin up a dedicated loop in a background thread
-background_loop = asyncio.new_event_loop()
-def _start_background_loop(loop):
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(assistant.initialize_session())
-    loop.run_forever()
+# The connection assistant owns the MCP connection pool that all user sessions share
+connection = InteractiveBankingAssistant()
 
-t = threading.Thread(target=_start_background_loop, args=(background_loop,), daemon=True)
-t.start()
+# One assistant per logged in user, created on their first message and pinned
+# to the user of the token
+sessions = SessionManager(
+    lambda user_id: InteractiveBankingAssistant(user_id=user_id, pool=connection.pool,
+                                                pin_user=True)
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The assistants run directly on the server's event loop
+    init_db()
+    await connection.initialize_session()
+    yield
+    await connection.close_session()
+
+
+# Initialize the app pointing to local templates/ and static/
+app = FastAPI(lifespan=lifespan)
+app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
+templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
 # Helpers for JWT
 def create_access_token(username: str) -> str:
@@ -38,71 +59,118 @@ def verify_access_token(token: str) -> str:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user = payload.get("sub")
         if not user:
-            abort(401, "Invalid token payload")
+            raise HTTPException(401, "Invalid token payload")
         return user
     except jwt.ExpiredSignatureError:
-        abort(401, "Token has expired")
+        raise HTTPException(401, "Token has expired")
     except jwt.InvalidTokenError:
-        abort(401, "Invalid token")
+        raise HTTPException(401, "Invalid token")
+
+
+async def read_chat_request(request: Request):
+    """Authenticate the chat request and extract its message.
+
+    :return: A tuple of the user ID, the message and an error response, where the
+        error response is None when the request is valid.
+    """
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return None, None, JSONResponse({"reply": "🔒 Please login to continue."}, status_code=401)
+    token = auth_header.split(" ", 1)[1]
+    user = verify_access_token(token)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return None, None, JSONResponse({"reply": "💡 The request body must be a JSON object."}, status_code=400)
+    msg = data.get("message")
+    msg = msg.strip() if isinstance(msg, str) else ""
+    if not msg:
+        return None, None, JSONResponse({"reply": "💡 I didn’t get any text."}, status_code=400)
+    return user, msg, None
 
 # Routes
-@app.route("/", methods=["GET"])
-def index():
-    return render_template("chat.html")
+@app.get("/")
+async def index(request: Request):
+    return templates.TemplateResponse(request, "chat.html")
 
-@app.route("/auth/login", methods=["POST"])
-def auth_login():
-    data = request.get_json() or {}
+@app.post("/auth/login")
+async def auth_login(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        raise HTTPException(400, "The request body must be a JSON object")
     username = data.get("username")
     password = data.get("password")
     if not username or not password:
-        abort(400, 'Missing "username" or "password"')
+        raise HTTPException(400, 'Missing "username" or "password"')
 
     # Validate against real database
-    if not auth_user(username, password):
-        return jsonify({"status": "fail"}), 401
+    if not await asyncio.to_thread(auth_user, username, password):
+        return JSONResponse({"status": "fail"}, status_code=401)
 
     token = create_access_token(username)
-    return jsonify({"status": "success", "access_token": token, "token_type": "bearer"}), 200
-
-@app.route("/chat", methods=["POST"])
-def chat():
-    # 3) auth as before…
-    auth_header = request.headers.get("Authorization", "")
-    if not auth_header.startswith("Bearer "):
-        return jsonify({"reply": "🔒 Please login to continue."}), 401
-    token = auth_header.split(" ", 1)[1]
-    user = verify_access_token(token)
+    return {"status": "success", "access_token": token, "token_type": "bearer"}
 
-    # 4) Grab the incoming message
-    msg = request.json.get("message", "").strip()
-    if not msg:
-        return jsonify({"reply": "💡 I didn’t get any text."}), 400
+@app.post("/chat")
+async def chat(request: Request):
+    user, msg, error = await read_chat_request(request)
+    if error:
+        return error
 
-    # 5) Schedule your send_message onto the background loop
-    future = asyncio.run_coroutine_threadsafe(
-        assistant.send_message(msg),
-        background_loop
-    )
+    # Await the user's assistant directly on the server's loop
     try:
-        result = future.result(timeout=30)   # wait up to 30s
+        result = await asyncio.wait_for(sessions.send_message(user, msg), REPLY_TIMEOUT_SECONDS)
     except Exception as e:
-        return jsonify({"reply": f"❌ Internal error: {e}"}), 500
+        return JSONResponse({"reply": f"❌ Internal error: {e}"}, status_code=500)
 
-    # 6) Handle the two possible return types
+    # Handle the two possible return types
     #    - A string → that’s your model’s reply
     #    - A dict/list → that’s raw tool output, so jsonify it or summarize
     if isinstance(result, str):
-        return jsonify({"reply": result})
+        return {"reply": result}
 
     # If it’s a dict with an "error" key, bubble that up:
     if isinstance(result, dict) and "error" in result:
-        return jsonify({"reply": result["error"]})
+        return {"reply": result["error"]}
 
     # Otherwise, just stringify the payload
-    return jsonify({"reply": json.dumps(result, indent=2)})
+    return {"reply": json.dumps(result, indent=2)}
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request):
+    user, msg, error = await read_chat_request(request)
+    if error:
+        return error
+
+    async def generate():
+        events = sessions.stream_message(user, msg)
+        try:
+            while True:
+                try:
+                    kind, content = await asyncio.wait_for(events.__anext__(), REPLY_TIMEOUT_SECONDS)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    kind, content = "error", "❌ Internal error: the reply timed out"
+                except Exception as e:
+                    kind, content = "error", f"❌ Internal error: {e}"
+                yield f"data: {json.dumps({'type': kind, 'content': content})}\n\n"
+                if kind == "error":
+                    break
+        finally:
+            # Stop generating when the client goes away or the reply timed out
+            await events.aclose()
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 if __name__ == "__main__":
-    init_db()
-    # Turn off the reloader
-    app.run(host="0.0.0.0", port=3000, debug=True, use_reloader=False)
+    uvicorn.run(app, host="0.0.0.0", port=3000)
@@ -0,0 +1,122 @@
+"""Benchmark the transaction history query on a database with millions of transfers.
+
+Usage::
+
+    python benchmarks/bench_transaction_history.py --transfers 2000000
+
+The database is created in a temporary directory unless ``--db`` is given, so the
+real ``bank.db`` is never touched.
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Add the parent directory to the Python path to import from chatbot
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def seed(db_file: str, transfers: int, accounts: int, days: int, init_sql: str):
+    """Create the schema and insert random transfers spread over the given days."""
+    con = sqlite3.connect(db_file)
+    con.executescript(init_sql)
+    account_numbers = [f"{i:010d}" for i in range(10_000_000, 10_000_000 + accounts)]
+    con.executemany(
+        "INSERT OR IGNORE INTO Accounts (AccountNumber, UserId, AccountName, Balance, CurrencyCode) "
+        "VALUES (?, 'bench', 'Bench', 1000000, 'CAD')",
+        ((number,) for number in account_numbers)
+    )
+    now = datetime.now()
+
+    def rows():
+        for _ in range(transfers):
+            from_account, to_account = random.sample(account_numbers, 2)
+            when = now - timedelta(seconds=random.randrange(days * 86400))
+            yield (str(uuid.uuid4()), from_account, to_account, when.isoformat(),
+                   "10.00", "1000.00", "1000.00")
+
+    con.executemany(
+        "INSERT INTO Transfers (TransactionNumber, FromAccountNumber, ToAccountNumber, "
+        "TransferDateTime, Amount, FromAccountBalance, ToAccountBalance) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows()
+    )
+    con.commit()
+    con.close()
+    return account_numbers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transfers", type=int, default=2_000_000)
+    parser.add_argument("--accounts", type=int, default=10_000)
+    parser.add_argument("--span-days", type=int, default=3 * 365,
+                        help="Days of history the seeded transfers are spread over")
+    parser.add_argument("--window-days", type=int, default=30,
+                        help="Days of history each lookup asks for")
+    parser.add_argument("--lookups", type=int, default=2_000)
+    parser.add_argument("--db", help="Database file to create, defaults to a temporary file")
+    args = parser.parse_args()
+
+    temp_dir = None if args.db else tempfile.mkdtemp()
+    db_file = args.db or os.path.join(temp_dir, "bench.db")
+    os.environ["CHATBOT_DB_FILE"] = db_file
+    try:
+        run(args, db_file)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def run(args, db_file: str):
+    """Seed the database, migrate it, which backfills the ledger, and time the history lookups."""
+    # Import after setting the database file, which the config reads at import time
+    from chatbot.config import DB_INIT_SQL
+    from chatbot.database import init_db, load_transaction_history
+    from chatbot.db_pool import connection
+
+    started = time.perf_counter()
+    account_numbers = seed(db_file, args.transfers, args.accounts, args.span_days,
+                           DB_INIT_SQL.read_text())
+    print(f"Seeded {args.transfers:,} transfers in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    init_db()
+    print(f"Migrated in {time.perf_counter() - started:.1f}s")
+
+    start_date = (datetime.now() - timedelta(days=args.window_days)).isoformat()
+    with connection() as con:
+        plan = con.execute(
+            "EXPLAIN QUERY PLAN SELECT TransactionNumber FROM Transactions "
+            "WHERE AccountNumber = ? AND TransactionDateTime >= ?",
+            (account_numbers[0], start_date)
+        ).fetchall()
+    print("Query plan:", "; ".join(row["detail"] for row in plan))
+
+    # Warm the page cache and the connection pool
+    for number in account_numbers[:100]:
+        load_transaction_history(number, start_date)
+
+    timings = []
+    rows = 0
+    for _ in range(args.lookups):
+        number = random.choice(account_numbers)
+        started = time.perf_counter()
+        rows += len(load_transaction_history(number, start_date))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{args.lookups} lookups, {rows / args.lookups:.1f} transactions each")
+    print(f"mean {statistics.mean(timings):.3f} ms, p50 {statistics.median(timings):.3f} ms, "
+          f"p99 {p99:.3f} ms, max {timings[-1]:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark the vector store backends on recall@5 and query latency.
+
+Usage::
+
+    python benchmarks/bench_vector_store.py --chunks 50000 --dim 768
+
+Chunks get random clustered embeddings, so no embedding model is needed.  The
+exact top 5 by cosine similarity is the ground truth for recall.  Chroma and the
+HNSW index of the NumPy store are skipped when their packages are not installed.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the parent directory to the Python path to import from chatbot
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.embeddings import Embeddings
+
+
+class LookupEmbeddings(Embeddings):
+    """Embeddings read from a table, keyed by the text "chunk <n>"."""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[int(text.split()[1])].tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def make_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Random unit vectors spread around cluster centres, like the chunks of related documents."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(clusters, size=count)] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(store, count: int, batch_size: int = 1000):
+    for start in range(0, count, batch_size):
+        end = min(start + batch_size, count)
+        store.add_texts([f"chunk {i}" for i in range(start, end)],
+                        ids=[str(i) for i in range(start, end)])
+    if hasattr(store, "flush"):
+        store.flush()
+
+
+def measure(name: str, store, queries: np.ndarray, truth: np.ndarray, k: int):
+    # Warm up
+    for query in queries[:10]:
+        store.similarity_search_by_vector(query.tolist(), k=k)
+
+    timings = []
+    recalls = []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        documents = store.similarity_search_by_vector(query.tolist(), k=k)
+        timings.append((time.perf_counter() - started) * 1000)
+        found = {int(document.page_content.split()[1]) for document in documents}
+        recalls.append(len(found & set(expected.tolist())) / k)
+
+    timings.sort()
+    p99 = timings[max(int(len(timings) * 0.99) - 1, 0)]
+    print(f"{name:<14} recall@{k} {statistics.mean(recalls):.3f}   "
+          f"p50 {statistics.median(timings):.3f} ms   p99 {p99:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from chatbot.rag.numpy_store import NumpyVectorStore, hnswlib
+
+    vectors = make_vectors(args.chunks + args.queries, args.dim, args.clusters, args.seed)
+    chunks, queries = vectors[:args.chunks], vectors[args.chunks:]
+    embeddings = LookupEmbeddings(vectors)
+    truth = np.argsort(-(queries @ chunks.T), axis=1)[:, :args.k]
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        backends = [("numpy", lambda path: NumpyVectorStore(path, embeddings, use_ann=False))]
+        if hnswlib is not None:
+            backends.append(("numpy+hnsw", lambda path: NumpyVectorStore(path, embeddings, use_ann=True,
+                                                                         ann_min_size=0)))
+        try:
+            from langchain_chroma import Chroma
+            backends.append(("chroma", lambda path: Chroma(persist_directory=path, embedding_function=embeddings,
+                                                           collection_metadata={"hnsw:space": "cosine"})))
+        except ImportError:
+            print("langchain_chroma is not installed, skipping Chroma")
+
+        for name, factory in backends:
+            path = os.path.join(temp_dir, name)
+            started = time.perf_counter()
+            build(factory(path), args.chunks)
+            print(f"{name:<14} built {args.chunks:,} chunks in {time.perf_counter() - started:.1f}s")
+
+            # Measure a freshly loaded store, as the server would use it
+            started = time.perf_counter()
+            store = factory(path)
+            store.similarity_search_by_vector(queries[0].tolist(), k=args.k)
+            print(f"{name:<14} loaded and answered the first query in {time.perf_counter() - started:.2f}s")
+            measure(name, store, queries, truth, args.k)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
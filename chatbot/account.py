@@ -1,9 +1,144 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
 from datetime import date
 from datetime import timedelta
 from decimal import Decimal
+from typing import Optional
 import chatbot.database
-from chatbot.models import Account
-from chatbot.database import load_accounts, load_transfer_target_accounts, transfer_fund_between_accounts
+from chatbot.config import ACCOUNT_CACHE_TTL, ACCOUNT_CACHE_SIZE, ACCOUNT_CACHE_MISS_SIZE
+from chatbot.models import Account, TransferResult
+from chatbot.database import load_accounts, load_account, add_transfer_listener, find_transfers_by_idempotency_key
+from chatbot.transfer_queue import get_transfer_writer
+
+
+class AccountCache:
+    """
+    Read-through cache of each user's accounts, indexed by account number.
+
+    Entries expire after a TTL and are dropped as soon as a transfer touching the
+    user's accounts is committed, so reads stay correct after transfers.  The
+    least recently used users are dropped past ``max_users``, and expired entries
+    are dropped when they are looked up.  Account numbers that belong to no
+    account of their user are remembered apart, in a smaller LRU, so looking up
+    made-up numbers cannot crowd out the real accounts.
+    """
+
+    def __init__(self, ttl: float = ACCOUNT_CACHE_TTL, max_users: int = ACCOUNT_CACHE_SIZE,
+                 max_misses: int = ACCOUNT_CACHE_MISS_SIZE):
+        """
+        :param ttl: Seconds an entry is served before it is loaded again.
+        :param max_users: The number of users whose accounts are kept.
+        :param max_misses: The number of unknown account numbers kept.
+        """
+        self.ttl = ttl
+        self.max_users = max_users
+        self.max_misses = max_misses
+        self._entries: "OrderedDict[str, tuple[float, dict[str, Account]]]" = OrderedDict()
+        # Single accounts looked up without loading all of the user's accounts
+        self._points: "OrderedDict[str, dict[str, tuple[float, Account]]]" = OrderedDict()
+        # Account numbers that are not accounts of the user.  Transfers never create
+        # accounts, so these only expire.
+        self._misses: "OrderedDict[tuple[str, str], tuple[float, None]]" = OrderedDict()
+        # Bumped on every invalidation, so a load that raced with a transfer is not cached
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _lookup(entries: OrderedDict, key, now: float):
+        """Get an unexpired entry and mark it recently used, dropping it if it expired."""
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def _store(entries: OrderedDict, key, entry, max_size: int):
+        """Put an entry as the most recently used, dropping the least recently used past the bound."""
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > max_size:
+            entries.popitem(last=False)
+
+    def get(self, user_id: str) -> dict[str, Account]:
+        """
+        Get the accounts of the user, loading them from the database on a miss.
+
+        :param user_id: The user ID of the account owner.
+        :return: The user's accounts keyed by account number.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(self._entries, user_id, now)
+            version = self._version
+        if entry is not None:
+            return entry[1]
+
+        accounts = {account.account_number: account for account in load_accounts(user_id)}
+        with self._lock:
+            if self._version == version:
+                self._store(self._entries, user_id, (now + self.ttl, accounts), self.max_users)
+        return accounts
+
+    def get_one(self, user_id: str, account_number: str) -> Optional[Account]:
+        """
+        Get one account of the user, looking only that account up on a miss.
+
+        :param user_id: The user ID of the account owner.
+        :param account_number: The account number of the account.
+        :return: The account, or None if the user has no account with that number.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(self._entries, user_id, now)
+            if entry is not None:
+                return entry[1].get(account_number)
+            if self._lookup(self._misses, (user_id, account_number), now) is not None:
+                return None
+            points = self._points.get(user_id)
+            point = points.get(account_number) if points is not None else None
+            if point is not None:
+                if point[0] > now:
+                    self._points.move_to_end(user_id)
+                    return point[1]
+                del points[account_number]
+            version = self._version
+
+        account = load_account(user_id, account_number)
+        with self._lock:
+            if self._version == version:
+                if account is None:
+                    self._store(self._misses, (user_id, account_number), (now + self.ttl, None),
+                                self.max_misses)
+                else:
+                    points = self._points.get(user_id) or {}
+                    points[account_number] = (now + self.ttl, account)
+                    self._store(self._points, user_id, points, self.max_users)
+        return account
+
+    def invalidate(self, user_id: str):
+        """Drop the cached accounts of the user."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._points.pop(user_id, None)
+            self._version += 1
+
+    def clear(self):
+        """Drop all cached accounts."""
+        with self._lock:
+            self._entries.clear()
+            self._points.clear()
+            self._misses.clear()
+            self._version += 1
+
+
+account_cache = AccountCache()
+add_transfer_listener(lambda user_id, from_account, to_account: account_cache.invalidate(user_id))
 
 
 def list_accounts(user_id: str) -> list[Account]:
@@ -13,7 +148,18 @@ def list_accounts(user_id: str) -> list[Account]:
     :param user_id: The user ID of the account owner.
     :return: All accounts that are avaialbe for transfering.
     """
-    return load_accounts(user_id)
+    return list(account_cache.get(user_id).values())
+
+
+def get_account(user_id: str, account_number: str) -> Optional[Account]:
+    """
+    Get one of the user's accounts by its account number.
+
+    :param user_id: The user ID of the account owner.
+    :param account_number: The account number of the account.
+    :return: The account, or None if the user has no account with that number.
+    """
+    return account_cache.get_one(user_id, account_number)
 
 
 def list_transfer_target_accounts(user_id: str,
@@ -25,16 +171,77 @@ def list_transfer_target_accounts(user_id: str,
     :param from_account: The account number or account name that the fund will be transfered from.
     :return: All the accounts that funds can be transfered from the specified account.
     """
-    return load_transfer_target_accounts(user_id, from_account)
+    return [account for number, account in account_cache.get(user_id).items()
+            if number != from_account]
 
 
 def transfer_between_accounts(user_id: str,
                               from_account: str, to_account: str,
-                              amount: Decimal, description: str=""):
+                              amount: Decimal, description: str="",
+                              idempotency_key: Optional[str] = None) -> TransferResult:
     """ Transfer specific amount of fund from one account to the other of the same owner.
 
     :param user_id: The user ID of the account owner.
     :param from_account: The account number or account name that the fund will be transfered from.
     :param to_account: The account number or account name that the fund will be transfered to.
+    :param idempotency_key: A key that makes a retried transfer return the original result.
+    :return: The transaction number and the balances after the transfer.
+    """
+    return batch_transfer_between_accounts(user_id, [(from_account, to_account, amount)],
+                                           idempotency_key)[0]
+
+
+async def atransfer_between_accounts(user_id: str,
+                                     from_account: str, to_account: str,
+                                     amount: Decimal,
+                                     idempotency_key: Optional[str] = None) -> TransferResult:
+    """ Transfer funds like ``transfer_between_accounts``, without blocking the event loop.
+
+    :param user_id: The user ID of the account owner.
+    :param from_account: The account number or account name that the fund will be transfered from.
+    :param to_account: The account number or account name that the fund will be transfered to.
+    :param idempotency_key: A key that makes a retried transfer return the original result.
+    :return: The transaction number and the balances after the transfer.
+    """
+    return (await abatch_transfer_between_accounts(user_id, [(from_account, to_account, amount)],
+                                                   idempotency_key))[0]
+
+
+def batch_transfer_between_accounts(user_id: str,
+                                    transfers: list[tuple[str, str, Decimal]],
+                                    idempotency_key: Optional[str] = None) -> list[TransferResult]:
+    """ Transfer funds between accounts of the same owner, all legs in one transaction.
+
+    :param user_id: The user ID of the account owner.
+    :param transfers: The (from_account, to_account, amount) of each leg.
+    :param idempotency_key: A key that makes a retried request return the original results.
+    :return: The transaction number and the balances after each leg.
+    """
+    # A retry of an applied request is answered without waiting for the writer
+    if idempotency_key:
+        existing = find_transfers_by_idempotency_key(user_id, idempotency_key, transfers)
+        if existing is not None:
+            return existing
+    # Queued behind the single writer so concurrent transfers are committed together
+    return get_transfer_writer().transfer(user_id, transfers, idempotency_key)
+
+
+
+async def abatch_transfer_between_accounts(user_id: str,
+                                           transfers: list[tuple[str, str, Decimal]],
+                                           idempotency_key: Optional[str] = None) -> list[TransferResult]:
+    """ Transfer funds like ``batch_transfer_between_accounts``, without blocking the event loop.
+
+    The loop keeps serving other callers while the writer commits, so transfers
+    arriving together from concurrent tool calls are committed in one group.
+
+    :param user_id: The user ID of the account owner.
+    :param transfers: The (from_account, to_account, amount) of each leg.
+    :param idempotency_key: A key that makes a retried request return the original results.
+    :return: The transaction number and the balances after each leg.
     """
-    transfer_fund_between_accounts(user_id, from_account, to_account, amount)
+    if idempotency_key:
+        existing = find_transfers_by_idempotency_key(user_id, idempotency_key, transfers)
+        if existing is not None:
+            return existing
+    return await asyncio.wrap_future(get_transfer_writer().submit(user_id, transfers, idempotency_key))
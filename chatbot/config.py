@@ -5,6 +5,20 @@ from pathlib import Path
 # Database settings
 DB_FILE = os.environ.get("CHATBOT_DB_FILE", "bank.db")
 DB_INIT_SQL = Path(__file__).parent / "init.sql"
+DB_MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+DB_POOL_SIZE = int(os.environ.get("CHATBOT_DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("CHATBOT_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.environ.get("CHATBOT_DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.environ.get("CHATBOT_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_GROUP_COMMIT_MS = float(os.environ.get("CHATBOT_DB_GROUP_COMMIT_MS", "2"))
+DB_GROUP_COMMIT_MAX = int(os.environ.get("CHATBOT_DB_GROUP_COMMIT_MAX", "256"))
+
+# Seconds a user's accounts and balances are served from cache
+ACCOUNT_CACHE_TTL = float(os.environ.get("ACCOUNT_CACHE_TTL", "60"))
+# The number of users whose accounts are cached, least recently used dropped first
+ACCOUNT_CACHE_SIZE = int(os.environ.get("ACCOUNT_CACHE_SIZE", "10000"))
+# The number of account numbers remembered as not belonging to their user
+ACCOUNT_CACHE_MISS_SIZE = int(os.environ.get("ACCOUNT_CACHE_MISS_SIZE", "1024"))
 
 # Account number mappings (for client-side account name resolution)
 ACCOUNT_MAPPINGS = {
@@ -22,9 +36,55 @@ DEFAULT_USER_ID = "test1"
 
 # Vector database settings
 VECTOR_DB_DIR = os.environ.get("VECTOR_DB_DIR", "./chroma_db")
+# "chroma", or "numpy" for the in-process memory-mapped index, which can search
+# large stores through an approximate HNSW graph when hnswlib is installed
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+VECTOR_ANN = os.environ.get("VECTOR_ANN", "false").lower() in ("1", "true", "yes")
+VECTOR_ANN_MIN_SIZE = int(os.environ.get("VECTOR_ANN_MIN_SIZE", "20000"))
 DOCS_DIRECTORY = os.environ.get("DOCS_DIRECTORY", "./rbc_documents")
 
+# Document ingestion: worker processes that parse and split files, the number
+# of chunks embedded and written to the vector store at a time, and how many
+# embedded batches may wait for the vector store before embedding pauses
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", str(os.cpu_count() or 1)))
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "256"))
+INGEST_QUEUE_DEPTH = int(os.environ.get("INGEST_QUEUE_DEPTH", "4"))
+
+# RAG retrieval: chunks passed to the model, found by keyword and vector search
+RAG_TOP_K = int(os.environ.get("RAG_TOP_K", "4"))
+# Estimated tokens of retrieved context put in the prompt, about 4 characters each
+RAG_CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+# RAG questions answered at the same time by the async path; the rest wait their turn
+RAG_MAX_CONCURRENCY = int(os.environ.get("RAG_MAX_CONCURRENCY", "8"))
+
+# RAG answer cache: entries kept, seconds an answer is served, and how similar
+# (cosine) a question must be to a cached one to reuse its answer
+RAG_CACHE_SIZE = int(os.environ.get("RAG_CACHE_SIZE", "1000"))
+RAG_CACHE_TTL = float(os.environ.get("RAG_CACHE_TTL", "3600"))
+RAG_CACHE_SIMILARITY = float(os.environ.get("RAG_CACHE_SIMILARITY", "0.95"))
+
+# Embedding settings; the "fake" backend embeds offline, e.g. for tests
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "google")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "models/embedding-001")
+EMBEDDING_FAKE_SIZE = int(os.environ.get("EMBEDDING_FAKE_SIZE", "768"))
+EMBEDDING_CACHE_FILE = os.environ.get("EMBEDDING_CACHE_FILE", "./embedding_cache.db")
+# Query embedding: how long concurrent queries are gathered into one call to the
+# model, how many go in one call, and how many query vectors are kept in memory
+EMBEDDING_BATCH_WINDOW_MS = float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX = int(os.environ.get("EMBEDDING_BATCH_MAX", "64"))
+EMBEDDING_QUERY_CACHE_SIZE = int(os.environ.get("EMBEDDING_QUERY_CACHE_SIZE", "2048"))
+
 # API settings
 MCP_HOST = os.environ.get("MCP_HOST", "127.0.0.1")
 MCP_PORT = int(os.environ.get("MCP_PORT", "8050"))
 MCP_NAME = os.environ.get("MCP_NAME", "RBC-RAG-MCP")
+
+# Chat session settings
+SESSION_POOL_SIZE = int(os.environ.get("SESSION_POOL_SIZE", "1000"))
+SESSION_IDLE_TTL = int(os.environ.get("SESSION_IDLE_TTL", "1800"))
+SESSION_HISTORY_LIMIT = int(os.environ.get("SESSION_HISTORY_LIMIT", "20"))
+
+# MCP client connection pool settings
+MCP_POOL_SIZE = int(os.environ.get("MCP_POOL_SIZE", "4"))
+MCP_HEALTH_CHECK_INTERVAL = float(os.environ.get("MCP_HEALTH_CHECK_INTERVAL", "15"))
+MCP_CONNECT_TIMEOUT = float(os.environ.get("MCP_CONNECT_TIMEOUT", "10"))
@@ -4,7 +4,8 @@
 COMMANDS = {
     "exit": ["exit", "quit", "q", "bye", "goodbye"],
     "clear": ["clear", "clear history", "start over", "reset"],
-    "user": ["user", "switch user", "change user"]
+    "user": ["user", "switch user", "change user"],
+    "more": ["more", "show more", "load more", "more transactions", "show more transactions", "next page"]
 }
 
 
@@ -21,7 +22,10 @@ IMPORTANT INSTRUCTIONS:
    - For checking balances: use get_account_balance with account_number="1234567890" for checking/chequing or "2345678901" for savings or "3456789012" for credit card
    - For listing accounts: use list_user_accounts ONLY when explicitly asked to see accounts
    - For transfers: use transfer_funds with exact account numbers and amount as a string without $ or commas
+   - For several transfers requested together: use transfer_funds_batch with one entry per transfer
    - For transaction history: use get_transaction_history with the exact account number
+   - For the balance on a past date: use get_balance_at_date with the date as YYYY-MM-DD
+   - For statements or totals over a period (e.g. "how much did I spend last month"): use get_account_summary with start_date and end_date as YYYY-MM-DD
 
 4. For general banking questions about RBC products and services, use answer_banking_question. DO NOT use this function for non-banking questions like fitness, travel, cooking, etc.
 
@@ -128,6 +132,42 @@ TOOL_DEFINITIONS = [
             "required": ["user_id", "from_account", "to_account", "amount"]
         }
     },
+    {
+        "name": "transfer_funds_batch",
+        "description": "Transfer funds between several pairs of accounts at once. Either all transfers are made or none of them is.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "user_id": {
+                    "type": "string",
+                    "description": "The ID of the user (will be automatically filled)"
+                },
+                "transfers": {
+                    "type": "array",
+                    "description": "The transfers to make, in order",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "from_account": {
+                                "type": "string",
+                                "description": "The source account number (must be exact account number, not name)"
+                            },
+                            "to_account": {
+                                "type": "string",
+                                "description": "The destination account number (must be exact account number, not name)"
+                            },
+                            "amount": {
+                                "type": "string",
+                                "description": "The amount to transfer as a string without $ or commas (e.g., '50.00')"
+                            }
+                        },
+                        "required": ["from_account", "to_account", "amount"]
+                    }
+                }
+            },
+            "required": ["user_id", "transfers"]
+        }
+    },
     {
         "name": "get_account_balance",
         "description": "Get the balance of a specific account.",
@@ -148,7 +188,7 @@ TOOL_DEFINITIONS = [
     },
     {
         "name": "get_transaction_history",
-        "description": "Get the transaction history for a specific account.",
+        "description": "Get the transaction history for a specific account, newest first, one page at a time.",
         "parameters": {
             "type": "object",
             "properties": {
@@ -163,13 +203,73 @@ TOOL_DEFINITIONS = [
                 "days": {
                     "type": "integer",
                     "description": "Number of days of history to retrieve (default: 30)"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of transactions to return (default: 5)"
+                },
+                "cursor": {
+                    "type": "string",
+                    "description": "The next_cursor returned by a previous call, to get the next page of older transactions. Leave empty for the most recent transactions."
                 }
             },
             "required": ["user_id", "account_number"]
         }
+    },
+    {
+        "name": "get_balance_at_date",
+        "description": "Get the balance of a specific account at the end of a past day.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "user_id": {
+                    "type": "string",
+                    "description": "The ID of the user (will be automatically filled)"
+                },
+                "account_number": {
+                    "type": "string",
+                    "description": "The account number (must be exact account number, not name): 1234567890 for checking, 2345678901 for savings, 3456789012 for credit card"
+                },
+                "date": {
+                    "type": "string",
+                    "description": "The day, in YYYY-MM-DD format"
+                }
+            },
+            "required": ["user_id", "account_number", "date"]
+        }
+    },
+    {
+        "name": "get_account_summary",
+        "description": "Summarize a specific account over a period: opening and closing balances, total money in and out, and the number of transactions.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "user_id": {
+                    "type": "string",
+                    "description": "The ID of the user (will be automatically filled)"
+                },
+                "account_number": {
+                    "type": "string",
+                    "description": "The account number (must be exact account number, not name): 1234567890 for checking, 2345678901 for savings, 3456789012 for credit card"
+                },
+                "start_date": {
+                    "type": "string",
+                    "description": "The first day of the period, in YYYY-MM-DD format"
+                },
+                "end_date": {
+                    "type": "string",
+                    "description": "The last day of the period, in YYYY-MM-DD format (default: today)"
+                }
+            },
+            "required": ["user_id", "account_number", "start_date"]
+        }
     }
 ]
 
+# Tools that accept an idempotency key, which the client generates for each call
+# instead of asking the model for one
+IDEMPOTENT_TOOLS = {"transfer_funds", "transfer_funds_batch"}
+
 # Model configuration
 MODEL_CONFIG = {
     "model_name": "gemini-1.5-pro",
@@ -5,8 +5,32 @@ from datetime import datetime
 from datetime import timedelta
 from decimal import Decimal
 from pathlib import Path
-from chatbot.models import Account
-from chatbot.config import DB_FILE, DB_INIT_SQL
+from typing import Callable, Optional, Union
+from chatbot.models import Account, AccountSummary, Transaction, TransferResult
+from chatbot.config import DB_FILE, DB_INIT_SQL, DB_MIGRATIONS_DIR
+from chatbot.db_pool import connection
+
+
+# Callbacks run after every committed transfer, e.g. to invalidate cached balances
+_transfer_listeners: list[Callable[[str, str, str], None]] = []
+
+
+def add_transfer_listener(listener: Callable[[str, str, str], None]):
+    """
+    Register a callback to run after every committed transfer.
+
+    :param listener: Called with the user ID, the source account number and the
+        destination account number of the transfer.
+    """
+    _transfer_listeners.append(listener)
+
+
+def _notify_transfer_listeners(user_id: str, from_account: str, to_account: str):
+    for listener in _transfer_listeners:
+        try:
+            listener(user_id, from_account, to_account)
+        except Exception as e:
+            print(f"[ERROR] Transfer listener failed: {str(e)}")
 
 
 def auth_user(user_id: str, password: str) -> bool:
@@ -18,12 +42,9 @@ def auth_user(user_id: str, password: str) -> bool:
     :return: True if user ID and password are matched, False otherwise.
     """
     sql = "SELECT UserId FROM UserCredentials WHERE UserId=:user_id AND Password=:password"
-    con = sqlite3.connect(DB_FILE)
-    cur = con.cursor()
-    cur.execute(sql, {"user_id": user_id, "password": password})
-    authenticated = cur.fetchone() is not None
-    con.close()
-    return authenticated
+    with connection() as con:
+        cur = con.execute(sql, {"user_id": user_id, "password": password})
+        return cur.fetchone() is not None
 
 
 def load_accounts(user_id: str) -> list[Account]:
@@ -34,11 +55,8 @@ def load_accounts(user_id: str) -> list[Account]:
     :return: All the accounts that belong the the user
     """
     sql = "SELECT AccountNumber, AccountName, Balance FROM Accounts WHERE UserId=:user_id"
-    con = sqlite3.connect(DB_FILE)
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
-    cur.execute(sql, {"user_id": user_id})
-    rows = cur.fetchall()
+    with connection() as con:
+        rows = con.execute(sql, {"user_id": user_id}).fetchall()
     accounts = []
     for row in rows:
         account = Account()
@@ -46,42 +64,433 @@ def load_accounts(user_id: str) -> list[Account]:
         account.account_name = row['AccountName']
         account.balance = Decimal(str(row['Balance']))
         accounts.append(account)
-    con.close()
     return accounts
 
 
-def load_transfer_target_accounts(user_id: str, from_account: str) -> list[Account]:
+def load_account(user_id: str, account_number: str) -> Optional[Account]:
     """
-    Query accounts that the specified account can trasfer fund to.
+    Query one account of the specified user by its account number.
+
+    This is a single primary key lookup, so it does not depend on how many
+    accounts the user has.
 
     :param user_id: The user ID of the account owner
-    :param from_account: The account number or account name that the fund would be transferred from.
-    :return: All the accounts that the specified account can transfer to.
-    """
-    sql = """
-    SELECT AccountNumber, AccountName, Balance 
-    FROM Accounts 
-    WHERE UserId=:user_id AND AccountNumber!=:from_account
-    """
-    con = sqlite3.connect(DB_FILE)
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
-    cur.execute(sql, {"user_id": user_id, "from_account": from_account})
-    rows = cur.fetchall()
-    accounts = []
-    for row in rows:
-        account = Account()
-        account.account_number = row['AccountNumber']
-        account.account_name = row['AccountName']
-        account.balance = Decimal(str(row['Balance']))
-        accounts.append(account)
-    con.close()
-    return accounts
+    :param account_number: The account number of the account
+    :return: The account, or None if the user has no account with that number
+    """
+    sql = "SELECT AccountName, Balance FROM Accounts WHERE AccountNumber=:account_number AND UserId=:user_id"
+    with connection() as con:
+        row = con.execute(sql, {"user_id": user_id, "account_number": account_number}).fetchone()
+    if row is None:
+        return None
+    account = Account()
+    account.account_number = account_number
+    account.account_name = row['AccountName']
+    account.balance = Decimal(str(row['Balance']))
+    return account
+
+
+def load_transaction_history(account_number: str, start_date: str,
+                             limit: int = -1,
+                             before: Optional[tuple[str, str]] = None) -> list[Transaction]:
+    """
+    Query the ledger entries of the specified account, newest first.
+
+    Every transfer writes a debit entry for the source account and a credit entry
+    for the destination account into Transactions, so the history is a single
+    range scan of the covering index on the account number and the transaction
+    date.  Pages are selected by keyset: ``before`` is the (TransactionDateTime,
+    TransactionNumber) of the last transaction of the previous page.
+
+    :param account_number: The account number of the account.
+    :param start_date: The earliest transaction date to include, in ISO 8601 format.
+    :param limit: The maximum number of transactions to return, -1 for no limit.
+    :param before: Only return transactions that sort after this key, if specified.
+    :return: The transactions of the account since the start date.
+    """
+    keyset = "AND (TransactionDateTime, TransactionNumber) < (:before_datetime, :before_number)" if before else ""
+    sql = f"""
+    SELECT TransactionNumber, TransactionDateTime, TransactionTypeCode, Amount,
+           OtherAccountNumber, BalanceAfter
+    FROM Transactions
+    WHERE AccountNumber = :account_number AND TransactionDateTime >= :start_date {keyset}
+    ORDER BY TransactionDateTime DESC, TransactionNumber DESC
+    LIMIT :limit
+    """
+    params = {"account_number": account_number, "start_date": start_date, "limit": limit}
+    if before:
+        params["before_datetime"], params["before_number"] = before
+    with connection() as con:
+        rows = con.execute(sql, params).fetchall()
+    return [
+        Transaction(
+            transaction_number=row['TransactionNumber'],
+            transaction_datetime=row['TransactionDateTime'],
+            transaction_type=row['TransactionTypeCode'],
+            amount=Decimal(str(row['Amount'])),
+            description=(f"Transfer to {row['OtherAccountNumber']}" if row['TransactionTypeCode'] == 'debit'
+                         else f"Transfer from {row['OtherAccountNumber']}"),
+            balance_after=Decimal(str(row['BalanceAfter']))
+        )
+        for row in rows
+    ]
+
+
+def _balance_at_end_of(cur: sqlite3.Cursor, account_number: str, balance_date: str) -> Optional[Decimal]:
+    """The balance at the end of a day from the snapshots, or None if the account does not exist."""
+    row = cur.execute(
+        """
+        SELECT ClosingBalance FROM AccountDailyBalances
+        WHERE AccountNumber = ? AND BalanceDate <= ?
+        ORDER BY BalanceDate DESC LIMIT 1
+        """,
+        (account_number, balance_date)
+    ).fetchone()
+    if row is None:
+        # Nothing happened up to that day, so the balance is what the account
+        # opened with on its next day of activity, or its current balance
+        row = cur.execute(
+            """
+            SELECT OpeningBalance FROM AccountDailyBalances
+            WHERE AccountNumber = ? AND BalanceDate > ?
+            ORDER BY BalanceDate LIMIT 1
+            """,
+            (account_number, balance_date)
+        ).fetchone()
+    if row is None:
+        row = cur.execute("SELECT Balance FROM Accounts WHERE AccountNumber = ?",
+                          (account_number,)).fetchone()
+    return Decimal(str(row[0])) if row is not None else None
+
+
+def load_balance_at_date(account_number: str, balance_date: str) -> Optional[Decimal]:
+    """
+    Query the balance of an account at the end of a day.
+
+    :param account_number: The account number of the account.
+    :param balance_date: The day, in ISO 8601 format (YYYY-MM-DD).
+    :return: The balance, or None if the account does not exist.
+    """
+    with connection() as con:
+        return _balance_at_end_of(con.cursor(), account_number, balance_date)
+
+
+def load_account_summary(account_number: str, start_date: str,
+                         end_date: str) -> Optional[AccountSummary]:
+    """
+    Summarize the activity of an account over a period from its daily balance snapshots.
+
+    :param account_number: The account number of the account.
+    :param start_date: The first day of the period, in ISO 8601 format (YYYY-MM-DD).
+    :param end_date: The last day of the period, in ISO 8601 format (YYYY-MM-DD).
+    :return: The balances and totals of the period, or None if the account does not exist.
+    """
+    day_before = (date.fromisoformat(start_date) - timedelta(days=1)).isoformat()
+    with connection() as con:
+        # Read the snapshots in one transaction so the balances and totals agree
+        con.execute("BEGIN")
+        cur = con.cursor()
+        opening_balance = _balance_at_end_of(cur, account_number, day_before)
+        if opening_balance is None:
+            return None
+        closing_balance = _balance_at_end_of(cur, account_number, end_date)
+        row = cur.execute(
+            """
+            SELECT COALESCE(SUM(TotalIn), 0), COALESCE(SUM(TotalOut), 0),
+                   COALESCE(SUM(TransactionCount), 0)
+            FROM AccountDailyBalances
+            WHERE AccountNumber = ? AND BalanceDate BETWEEN ? AND ?
+            """,
+            (account_number, start_date, end_date)
+        ).fetchone()
+        con.rollback()
+    return AccountSummary(
+        account_number=account_number,
+        start_date=start_date,
+        end_date=end_date,
+        opening_balance=opening_balance,
+        closing_balance=closing_balance,
+        total_in=Decimal(str(row[0])),
+        total_out=Decimal(str(row[1])),
+        transaction_count=row[2]
+    )
+
+
+def _idempotency_key_range(idempotency_key: str) -> tuple[str, str]:
+    """The range of the keys stored for the legs of a request, "<key>/<leg>"."""
+    if "/" in idempotency_key:
+        raise ValueError("Idempotency keys cannot contain '/'.")
+    return f"{idempotency_key}/", f"{idempotency_key}0"
+
+
+def _find_transfers_by_idempotency_key(cur: sqlite3.Cursor, user_id: str, idempotency_key: str,
+                                       transfers: list[tuple[str, str, Decimal]]
+                                       ) -> Optional[list[TransferResult]]:
+    """
+    Look up the transfers already recorded under an idempotency key.
+
+    :return: The original results, or None if the key has not been used.
+    :raises ValueError: If the key was used for a different request.
+    """
+    rows = cur.execute(
+        """
+        SELECT t.IdempotencyKey, t.TransactionNumber, t.FromAccountNumber, t.ToAccountNumber,
+               t.Amount, t.FromAccountBalance, t.ToAccountBalance, a.UserId
+        FROM Transfers t
+        JOIN Accounts a ON a.AccountNumber = t.FromAccountNumber
+        WHERE t.IdempotencyKey >= ? AND t.IdempotencyKey < ?
+        """,
+        _idempotency_key_range(idempotency_key)
+    ).fetchall()
+    if not rows:
+        return None
+    rows = sorted(rows, key=lambda row: int(row[0].rsplit("/", 1)[1]))
+    
+    results = [
+        TransferResult(
+            transaction_number=row[1],
+            from_account=row[2],
+            to_account=row[3],
+            amount=Decimal(str(row[4])),
+            from_account_balance=Decimal(str(row[5])),
+            to_account_balance=Decimal(str(row[6]))
+        )
+        for row in rows
+    ]
+    requested = [(from_account, to_account, Decimal(str(amount)))
+                 for from_account, to_account, amount in transfers]
+    recorded = [(result.from_account, result.to_account, result.amount) for result in results]
+    if any(row[7] != user_id for row in rows) or recorded != requested:
+        raise ValueError(f"Idempotency key {idempotency_key} was already used for a different transfer.")
+    return results
+
+
+def find_transfers_by_idempotency_key(user_id: str, idempotency_key: str,
+                                      transfers: list[tuple[str, str, Decimal]]
+                                      ) -> Optional[list[TransferResult]]:
+    """
+    Look up the result of a transfer request that was already applied.
+
+    :param user_id: The user ID of the account owner
+    :param idempotency_key: The key the client sent with the request.
+    :param transfers: The (from_account, to_account, amount) of each leg of the request.
+    :return: The results of the original request, or None if the key has not been used.
+    :raises ValueError: If the key was used for a different request.
+    """
+    with connection() as con:
+        return _find_transfers_by_idempotency_key(con.cursor(), user_id, idempotency_key, transfers)
+
+
+def _apply_transfers(cur: sqlite3.Cursor, user_id: str,
+                     transfers: list[tuple[str, str, Decimal]],
+                     idempotency_key: Optional[str] = None) -> list[TransferResult]:
+    """
+    Apply transfers inside the caller's transaction.
+
+    Each leg debits the source account only if it holds enough funds, and reads
+    both new balances back with ``RETURNING``.  The Transfers rows of all legs,
+    their debit and credit entries in Transactions and the daily balance
+    snapshots of the accounts are written together at the end.  The legs record
+    the idempotency key, if any, which the caller has checked is not used yet.
+
+    :raises ValueError: If a leg is invalid, an account does not exist or the
+        source account has insufficient funds.  Nothing is rolled back here.
+    """
+    current_time = datetime.now().isoformat()
+    results = []
+    for from_account, to_account, amount in transfers:
+        # Ensure amount is a Decimal
+        if not isinstance(amount, Decimal):
+            amount = Decimal(str(amount))
+        if amount <= 0:
+            raise ValueError(f"Transfer amount must be positive, got {amount}.")
+        if from_account == to_account:
+            raise ValueError(f"Cannot transfer from account {from_account} to itself.")
+        
+        # Convert amount to string for SQLite
+        amount_str = str(amount)
+        
+        # Deduct from source account if it has enough funds
+        row = cur.execute(
+            """
+            UPDATE Accounts SET Balance = Balance - :amount
+            WHERE UserId=:user_id AND AccountNumber=:account_number AND Balance >= :amount
+            RETURNING Balance
+            """,
+            {"amount": amount_str, "user_id": user_id, "account_number": from_account}
+        ).fetchone()
+        if row is None:
+            exists = cur.execute("SELECT 1 FROM Accounts WHERE UserId=? AND AccountNumber=?",
+                                 (user_id, from_account)).fetchone()
+            if exists is None:
+                raise ValueError(f"Account {from_account} not found.")
+            raise ValueError(f"Insufficient funds in account {from_account}.")
+        from_account_balance = row[0]
+        
+        # Add to destination account
+        row = cur.execute(
+            "UPDATE Accounts SET Balance = Balance + ? WHERE UserId=? AND AccountNumber=? RETURNING Balance",
+            (amount_str, user_id, to_account)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"Account {to_account} not found.")
+        to_account_balance = row[0]
+        
+        results.append(TransferResult(
+            transaction_number=str(uuid.uuid4()),
+            from_account=from_account,
+            to_account=to_account,
+            amount=amount,
+            from_account_balance=Decimal(str(from_account_balance)),
+            to_account_balance=Decimal(str(to_account_balance))
+        ))
+    
+    # Record the transfers with balances
+    cur.executemany(
+        """
+        INSERT INTO Transfers (
+            TransactionNumber, FromAccountNumber, ToAccountNumber, 
+            TransferDateTime, Amount, FromAccountBalance, ToAccountBalance, IdempotencyKey
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [(result.transaction_number, result.from_account, result.to_account, current_time,
+          str(result.amount), str(result.from_account_balance), str(result.to_account_balance),
+          f"{idempotency_key}/{leg}" if idempotency_key else None)
+         for leg, result in enumerate(results)]
+    )
+    
+    # Record both legs of each transfer in the ledger of its account
+    ledger = [leg
+              for result in results
+              for leg in (
+                  (result.transaction_number, result.from_account, result.to_account,
+                   'debit', -result.amount, result.from_account_balance),
+                  (result.transaction_number, result.to_account, result.from_account,
+                   'credit', result.amount, result.to_account_balance)
+              )]
+    cur.executemany(
+        """
+        INSERT INTO Transactions (
+            TransactionNumber, AccountNumber, OtherAccountNumber,
+            TransactionDateTime, TransactionTypeCode, Amount, BalanceAfter
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        [(transaction_number, account_number, other_account_number, current_time,
+          transaction_type, str(amount), str(balance_after))
+         for transaction_number, account_number, other_account_number,
+             transaction_type, amount, balance_after in ledger]
+    )
+    
+    # Roll the legs into the daily balance snapshots, in the order they were applied
+    cur.executemany(
+        """
+        INSERT INTO AccountDailyBalances (
+            AccountNumber, BalanceDate, OpeningBalance, ClosingBalance,
+            TotalIn, TotalOut, TransactionCount
+        )
+        VALUES (?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT (AccountNumber, BalanceDate) DO UPDATE SET
+            ClosingBalance = excluded.ClosingBalance,
+            TotalIn = TotalIn + excluded.TotalIn,
+            TotalOut = TotalOut + excluded.TotalOut,
+            TransactionCount = TransactionCount + 1
+        """,
+        [(account_number, current_time[:10], str(balance_after - amount), str(balance_after),
+          str(max(amount, Decimal(0))), str(max(-amount, Decimal(0))))
+         for _, account_number, _, _, amount, balance_after in ledger]
+    )
+    return results
+
+
+def apply_transfer_group(requests: list[tuple[str, list[tuple[str, str, Decimal]], Optional[str]]]
+                         ) -> list[Union[list[TransferResult], Exception]]:
+    """
+    Apply several independent transfer requests with a single commit.
+
+    Each request runs inside its own savepoint, so a request that fails is rolled
+    back on its own while the others are still committed together.  A request
+    whose idempotency key is already recorded is not applied again, and its
+    original results are returned.
+
+    :param requests: The user ID, the (from_account, to_account, amount) legs and
+        the idempotency key, or None, of each request.
+    :return: For each request, in the same order, either the results of its legs or
+        the exception that made it fail.
+    """
+    outcomes: list[Union[list[TransferResult], Exception]] = []
+    # Requests whose idempotency key was already applied, which move no money now
+    replayed = set()
+    with connection() as con:
+        cur = con.cursor()
+        try:
+            # Start a transaction, taking the write lock up front so the busy
+            # timeout applies instead of failing on a lock upgrade
+            con.execute("BEGIN IMMEDIATE")
+            for index, (user_id, transfers, idempotency_key) in enumerate(requests):
+                con.execute("SAVEPOINT transfer_request")
+                try:
+                    existing = None
+                    if idempotency_key:
+                        existing = _find_transfers_by_idempotency_key(cur, user_id, idempotency_key,
+                                                                      transfers)
+                    if existing is not None:
+                        print(f"[DEBUG] Transfer with idempotency key {idempotency_key} was already applied")
+                        replayed.add(index)
+                        outcomes.append(existing)
+                    else:
+                        outcomes.append(_apply_transfers(cur, user_id, transfers, idempotency_key))
+                except Exception as e:
+                    con.execute("ROLLBACK TO transfer_request")
+                    print(f"[ERROR] Database error during transfer: {str(e)}")
+                    outcomes.append(e)
+                con.execute("RELEASE transfer_request")
+            
+            # Commit the transaction
+            con.commit()
+        except Exception as e:
+            # Rollback in case of error
+            con.rollback()
+            print(f"[ERROR] Database error during transfer: {str(e)}")
+            return [e] * len(requests)
+    
+    for index, ((user_id, _, _), outcome) in enumerate(zip(requests, outcomes)):
+        if isinstance(outcome, Exception) or index in replayed:
+            continue
+        for result in outcome:
+            print(f"[DEBUG] Transfer successful: {result.amount} from {result.from_account} to {result.to_account}")
+            _notify_transfer_listeners(user_id, result.from_account, result.to_account)
+    return outcomes
+
+
+def transfer_funds_batch(user_id: str,
+                         transfers: list[tuple[str, str, Decimal]],
+                         idempotency_key: Optional[str] = None) -> list[TransferResult]:
+    """
+    Apply many transfers between accounts of the same owner in one transaction.
+
+    Either every leg is applied or, if any leg fails, none of them is.
+
+    :param user_id: The user ID of the account owner
+    :param transfers: The (from_account, to_account, amount) of each leg, applied in order.
+    :param idempotency_key: A key that makes retrying the request return the
+        original results instead of applying it again.
+    :return: The result of each leg, in the same order.
+    :raises ValueError: If a leg is invalid, an account does not exist, a source
+        account has insufficient funds or the idempotency key was used for a
+        different request.
+    """
+    outcome = apply_transfer_group([(user_id, transfers, idempotency_key)])[0]
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
 
 
 def transfer_fund_between_accounts(user_id: str,
                                    from_account: str, to_account: str,
-                                   amount: Decimal):
+                                   amount: Decimal,
+                                   idempotency_key: Optional[str] = None) -> TransferResult:
     """
     Deduct fund from one account then add to the other account all under the same owner
     
@@ -89,100 +498,133 @@ def transfer_fund_between_accounts(user_id: str,
     :param from_account: The account number or account name that the fund would be transferred from.
     :param to_account: The account number or account name that the fund would be transferred to.
     :param amount: The amount that is going to be transfered.
+    :param idempotency_key: A key that makes retrying the transfer return the
+        original result instead of moving the fund again.
+    :return: The transaction number and the balances after the transfer.
+    :raises ValueError: If an account does not exist, the source account has insufficient
+        funds or the idempotency key was used for a different transfer.
     """
     # Debug the parameters
     print(f"[DEBUG] transfer_fund_between_accounts: user_id={user_id}, from={from_account}, to={to_account}, amount={amount} (type: {type(amount)})")
     
-    # Ensure amount is a Decimal
-    if not isinstance(amount, Decimal):
-        amount = Decimal(str(amount))
-    
-    con = sqlite3.connect(DB_FILE)
-    cur = con.cursor()
-    
-    try:
-        # Start a transaction
-        con.execute("BEGIN TRANSACTION")
-        
-        # Convert amount to string for SQLite
-        amount_str = str(amount)
-        
-        # Deduct from source account
-        cur.execute(
-            "UPDATE Accounts SET Balance = Balance - ? WHERE UserId=? AND AccountNumber=?",
-            (amount_str, user_id, from_account)
-        )
-        
-        # Add to destination account
-        cur.execute(
-            "UPDATE Accounts SET Balance = Balance + ? WHERE UserId=? AND AccountNumber=?",
-            (amount_str, user_id, to_account)
-        )
-        
-        # Get the updated balances after the transfer
-        cur.execute("SELECT Balance FROM Accounts WHERE UserId=? AND AccountNumber=?", 
-                   (user_id, from_account))
-        from_account_balance = cur.fetchone()[0]
-        
-        cur.execute("SELECT Balance FROM Accounts WHERE UserId=? AND AccountNumber=?", 
-                   (user_id, to_account))
-        to_account_balance = cur.fetchone()[0]
-        
-        # Record the transfer with balances
-        import uuid
-        import datetime
-        transaction_id = str(uuid.uuid4())
-        current_time = datetime.datetime.now().isoformat()
-        
-        cur.execute(
-            """
-            INSERT INTO Transfers (
-                TransactionNumber, FromAccountNumber, ToAccountNumber, 
-                TransferDateTime, Amount, FromAccountBalance, ToAccountBalance
+    return transfer_funds_batch(user_id, [(from_account, to_account, amount)], idempotency_key)[0]
+
+
+def backfill_transactions() -> int:
+    """
+    Write the missing ledger entries of the transfers recorded in Transfers.
+
+    Transfers recorded before the ledger was written, or copied in from another
+    database, get their debit and credit entries added.  Entries that already
+    exist are left alone, so the backfill can be run any number of times.
+
+    :return: The number of ledger entries added.
+    """
+    with connection() as con:
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            cur = con.execute(
+                """
+                INSERT OR IGNORE INTO Transactions (
+                    TransactionNumber, AccountNumber, OtherAccountNumber,
+                    TransactionDateTime, TransactionTypeCode, Amount, BalanceAfter
+                )
+                SELECT TransactionNumber, FromAccountNumber, ToAccountNumber,
+                       TransferDateTime, 'debit', -Amount, FromAccountBalance
+                FROM Transfers
+                UNION ALL
+                SELECT TransactionNumber, ToAccountNumber, FromAccountNumber,
+                       TransferDateTime, 'credit', Amount, ToAccountBalance
+                FROM Transfers
+                """
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (transaction_id, from_account, to_account, current_time, 
-             amount_str, from_account_balance, to_account_balance)
-        )
-        
-        # Commit the transaction
-        con.commit()
-        print(f"[DEBUG] Transfer successful: {amount_str} from {from_account} to {to_account}")
-    except Exception as e:
-        # Rollback in case of error
-        con.rollback()
-        print(f"[ERROR] Database error during transfer: {str(e)}")
-        raise e
-    finally:
-        con.close()
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+    print(f"Backfilled {cur.rowcount} ledger entries into Transactions")
+    return cur.rowcount
+
+
+def _split_statements(script: str) -> list[str]:
+    """Split a SQL script into its statements, keeping triggers whole."""
+    statements = []
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            statements.append(statement)
+            statement = ""
+    if statement.strip():
+        statements.append(statement)
+    return statements
+
+
+def migrate_db(con: sqlite3.Connection):
+    """
+    Apply the schema migrations the database has not seen yet.
+
+    Migrations are the numbered SQL scripts in ``DB_MIGRATIONS_DIR``.  The number
+    of the last applied one is kept in ``PRAGMA user_version``, and each script
+    runs in its own transaction together with the version bump.  The transaction
+    takes the write lock before reading the version, so processes starting at the
+    same time apply each migration once.
+
+    :param con: A connection to the database to migrate.
+    """
+    for path in sorted(DB_MIGRATIONS_DIR.glob("*.sql")):
+        number = int(path.name.split("_", 1)[0])
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            if con.execute("PRAGMA user_version").fetchone()[0] >= number:
+                con.rollback()
+                continue
+            for statement in _split_statements(path.read_text()):
+                con.execute(statement)
+            con.execute(f"PRAGMA user_version = {number}")
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        print(f"Applied database migration {path.name}")
 
 
 def init_db():
     """
-    Create the database and add inital test data.
+    Create the database and add inital test data, then bring its schema up to date.
     """
     # Check if database file already exists and has tables
     db_exists = Path(DB_FILE).exists()
     
-    if db_exists:
-        # Check if tables already exist
-        con = sqlite3.connect(DB_FILE)
-        cur = con.cursor()
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='UserCredentials'")
-        table_exists = cur.fetchone() is not None
-        con.close()
-        
+    with connection() as con:
+        table_exists = False
+        if db_exists:
+            # Check if tables already exist
+            cur = con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='UserCredentials'")
+            table_exists = cur.fetchone() is not None
+            
         if table_exists:
             print(f"Database {DB_FILE} already initialized.")
-            return
-    
-    # Create and initialize the database
-    with open(DB_INIT_SQL) as sql_file:
-        sql = sql_file.read()
-        con = sqlite3.connect(DB_FILE)
-        cur = con.cursor()
-        cur.executescript(sql)
-        con.commit()
-        con.close()
-        print(f"Database {DB_FILE} initialized successfully.")
+        else:
+            # Create and initialize the database
+            with open(DB_INIT_SQL) as sql_file:
+                sql = sql_file.read()
+            con.executescript(sql)
+            con.commit()
+            print(f"Database {DB_FILE} initialized successfully.")
+        
+        migrate_db(con)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the bank database.")
+    parser.add_argument("command", choices=["init", "backfill"],
+                        help="init: create and migrate the database; "
+                             "backfill: write the ledger entries of existing transfers")
+    args = parser.parse_args()
+
+    init_db()
+    if args.command == "backfill":
+        backfill_transactions()
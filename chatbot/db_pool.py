@@ -0,0 +1,143 @@
+"""Thread-safe pool of SQLite connections to the bank database."""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from chatbot.config import DB_FILE, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+
+
+class ConnectionPool:
+    """
+    Hands out SQLite connections that are opened once and reused.
+
+    Connections are opened lazily up to ``size``, in WAL mode so readers are not
+    blocked by a writer, and with a busy timeout so writers wait for the lock
+    instead of failing right away.  Callers that find the pool exhausted wait
+    until a connection is returned.
+    """
+
+    def __init__(self, db_file: str, size: int = DB_POOL_SIZE,
+                 busy_timeout_ms: int = DB_BUSY_TIMEOUT_MS,
+                 cache_size_kb: int = DB_CACHE_SIZE_KB,
+                 mmap_size: int = DB_MMAP_SIZE):
+        """
+        :param db_file: The path of the SQLite database file.
+        :param size: The maximum number of open connections.
+        :param busy_timeout_ms: How long to wait for a lock before failing.
+        :param cache_size_kb: The page cache size of each connection.
+        :param mmap_size: The number of bytes of the database file to memory-map.
+        """
+        self.db_file = db_file
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_file, check_same_thread=False,
+                              timeout=self.busy_timeout_ms / 1000)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is durable in WAL mode except for the last commits on power loss
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        con.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        con.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        con.execute("PRAGMA temp_store=MEMORY")
+        return con
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """
+        Take a connection out of the pool, opening a new one if the pool is not full.
+
+        :param timeout: Seconds to wait for a connection when all are in use,
+            defaults to the busy timeout.
+        :return: A connection that must be given back with ``release``.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                open_new = True
+            else:
+                open_new = False
+        if open_new:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        if timeout is None:
+            timeout = self.busy_timeout_ms / 1000
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No database connection available after {timeout}s")
+
+    def release(self, con: sqlite3.Connection):
+        """Give a connection back to the pool, rolling back anything left uncommitted."""
+        try:
+            if con.in_transaction:
+                con.rollback()
+        except sqlite3.Error:
+            # A broken connection is dropped, and a new one is opened on demand
+            with self._lock:
+                self._opened -= 1
+            con.close()
+            return
+        self._idle.put(con)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of a ``with`` block."""
+        con = self.acquire()
+        try:
+            yield con
+        finally:
+            self.release(con)
+
+    def close(self):
+        """Close all idle connections."""
+        while True:
+            try:
+                con = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
+            con.close()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the pool of the configured database, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_FILE)
+    return _pool
+
+
+@contextmanager
+def connection() -> Iterator[sqlite3.Connection]:
+    """
+    Borrow a pooled connection to the configured database.
+
+    Rows are returned as ``sqlite3.Row``, and an uncommitted transaction is rolled
+    back when the connection is given back.
+    """
+    with get_pool().connection() as con:
+        yield con
@@ -23,6 +23,10 @@ class IntentDetector:
         if any(text_lower == cmd for cmd in COMMANDS["clear"]):
             return ("clear", None)
             
+        # Check for more command, which loads the next page of transactions
+        if any(text_lower == cmd for cmd in COMMANDS["more"]):
+            return ("more", None)
+            
         # Check for user command
         if text_lower.startswith("user "):
             return ("user", text[5:].strip())
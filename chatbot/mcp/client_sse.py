@@ -4,124 +4,170 @@ import asyncio
 import sys
 import json
 import random
+import uuid
+from collections import deque
+from collections.abc import Mapping, Sequence
 from typing import Dict, List, Any, Optional, Tuple
 
 # Add the parent directory to the Python path to import from src and chatbot
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from mcp import ClientSession
-from mcp.client.sse import sse_client
 import google.generativeai as genai
 from dotenv import load_dotenv
 
 # Import custom modules
-from chatbot.config import DEFAULT_USER_ID, ACCOUNT_MAPPINGS
-from chatbot.config_client import (
-    SYSTEM_INSTRUCTIONS, 
-    TOOL_DEFINITIONS, MODEL_CONFIG
-)
+from chatbot.config import DEFAULT_USER_ID, ACCOUNT_MAPPINGS, SESSION_HISTORY_LIMIT
+from chatbot.config_client import SYSTEM_INSTRUCTIONS, IDEMPOTENT_TOOLS
+from chatbot.model_cache import get_model
 from chatbot.response_formatter import ResponseFormatter
 from chatbot.intent_detector import IntentDetector
+from chatbot.mcp.connection_pool import MCPConnectionPool
 
 # Load environment variables
 load_dotenv("../../.env")
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
+def _to_plain(value):
+    """
+    Convert function call arguments from Gemini to plain Python values.
+
+    Gemini gives objects and arrays as proto ``MapComposite`` and
+    ``RepeatedComposite`` values, at any depth, which cannot be serialized into
+    an MCP request.
+
+    :param value: The arguments, or any value nested in them.
+    :return: The value with every mapping turned into a dict and every array into a list.
+    """
+    if isinstance(value, Mapping):
+        return {key: _to_plain(item) for key, item in value.items()}
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return [_to_plain(item) for item in value]
+    return value
+
 class InteractiveBankingAssistant:
     """Interactive banking agent using Gemini and MCP."""
     
-    def __init__(self):
-        """Initialize the banking assistant."""
-        self.conversation_history = []
-        self.user_id = DEFAULT_USER_ID
-        self.session = None
-        self.read_stream = None
-        self.write_stream = None
+    def __init__(self, user_id: str = DEFAULT_USER_ID,
+                 pool: Optional[MCPConnectionPool] = None,
+                 history_limit: int = SESSION_HISTORY_LIMIT,
+                 pin_user: bool = False):
+        """
+        Initialize the banking assistant.
+
+        :param user_id: The user the assistant is acting for.
+        :param pool: An already started MCP connection pool to share with other
+            assistants.  When omitted, ``initialize_session`` starts a new one.
+        :param history_limit: The maximum number of messages kept in the history.
+        :param pin_user: Whether the assistant may only ever act for ``user_id``,
+            as for a user authenticated by a token.  The ``user`` command is then
+            refused, and every tool call is made for ``user_id``.
+        """
+        self.conversation_history = deque(maxlen=history_limit)
+        self.user_id = user_id
+        self.pin_user = pin_user
+        self.history_next_page = None
+        self.pool = pool
+        self.owns_pool = pool is None
         self.account_mappings = ACCOUNT_MAPPINGS
+        self._model = None
+
+    @property
+    def model(self):
+        """The Gemini model of this session, built for the current user on first use."""
+        if self._model is None:
+            self._model = get_model(self.user_id)
+        return self._model
     
     async def initialize_session(self):
-        """Initialize the MCP session."""
+        """Initialize the pool of MCP sessions."""
         from chatbot.config import MCP_HOST, MCP_PORT
+
+        if self.pool is not None:
+            return
         
         mcp_url = f"http://{MCP_HOST}:{MCP_PORT}/sse"
-        self.sse_client = sse_client(mcp_url)
-        self.read_stream, self.write_stream = await self.sse_client.__aenter__()
-        self.session = ClientSession(self.read_stream, self.write_stream)
-        await self.session.__aenter__()
-        await self.session.initialize()
+        self.pool = MCPConnectionPool(mcp_url)
+        await self.pool.start()
         print("\n🔄 Connected to RBC Banking Agent")
     
     async def close_session(self):
-        """Close the MCP session."""
-        if self.session:
-            await self.session.__aexit__(None, None, None)
-        if hasattr(self, 'sse_client'):
-            await self.sse_client.__aexit__(None, None, None)
+        """Close the pool of MCP sessions."""
+        if self.owns_pool and self.pool:
+            await self.pool.close()
     
-    async def _process_response(self, response):
-        """Process the response from Gemini, handling function calls."""
-        try:
-            # Check if the response has parts (structured response)
-            if hasattr(response, 'parts'):
-                result = []
-                has_function_call = False
-                
-                for part in response.parts:
-                    # Handle text parts
-                    if hasattr(part, 'text') and part.text:
-                        # Clean up the text
-                        text = part.text
-                        # Remove any function call syntax that might be in the text
-                        text = text.replace('[Function Call:', '').replace(']', '')
-                        # Remove "Assistant:" prefix
-                        text = text.replace('Assistant:', '')
-                        if text.strip():  # Only add non-empty text
-                            result.append(text.strip())
-                    
-                    # Check if there's a function call
-                    if hasattr(part, 'function_call'):
-                        has_function_call = True
-                    
-                    # Handle function calls
-                    if hasattr(part, 'function_call'):
-                        func_call = part.function_call
-                        function_name = func_call.name
-                        
-                        # Skip empty function calls silently without warning
-                        if not function_name or function_name.strip() == "":
-                            continue
-                        
-                        # Execute the function call through MCP and wait for result
-                        try:
-                            # Call the function through the MCP session and await the result
-                            function_result = await self._execute_function_call(function_name, func_call.args)
-                            
-                            # Parse the function result to extract actual data
-                            parsed_result = self._parse_function_result(function_result)
-                            
-                            # Format the result using the ResponseFormatter
-                            formatted_result = ResponseFormatter.format_response(function_name, parsed_result)
-                            if formatted_result:
-                                result.append(formatted_result)
-                                
-                        except Exception as e:
-                            error_msg = f"I'm sorry, I couldn't complete that action: {str(e)}"
-                            result.append(error_msg)
-                
-                # For simple greetings with no function calls, provide a friendly response
-                if not has_function_call and not result:
-                    return "Hello! How can I help with your banking needs today?"
+    async def _process_parts(self, parts, reply):
+        """
+        Process the parts of a streamed response chunk from Gemini, handling
+        function calls.
+
+        Yields ``("text", delta)`` for pieces of the model's text and ``("tool", text)``
+        for formatted function results, and records both in ``reply``.
+        """
+        for part in parts:
+            # Handle text parts
+            if hasattr(part, 'text') and part.text:
+                # Clean up the text
+                text = part.text
+                # Remove any function call syntax that might be in the text
+                text = text.replace('[Function Call:', '').replace(']', '')
+                # Remove "Assistant:" prefix
+                text = text.replace('Assistant:', '')
+                if text:
+                    reply["text"].append(text)
+                    yield ("text", text)
+            
+            # Handle function calls
+            if hasattr(part, 'function_call'):
+                reply["has_function_call"] = True
+                func_call = part.function_call
+                function_name = func_call.name
                 
-                # If there's an empty function call, provide a generic response
-                if has_function_call and not result:
-                    return "How can I help you with your banking needs today?"
+                # Skip empty function calls silently without warning
+                if not function_name or function_name.strip() == "":
+                    continue
                 
-                return "\n".join(result) if result else "Hello! How can I help with your banking needs today?"
-            else:
-                # Simple text response
-                return response.text
+                formatted_result = await self._run_tool(function_name, func_call.args)
+                if formatted_result:
+                    reply["tools"].append(formatted_result)
+                    yield ("tool", formatted_result)
+    
+    async def _run_tool(self, function_name, args):
+        """Execute a function call through MCP and format its result for the user."""
+        try:
+            # Call the function through the MCP session and await the result
+            function_result = await self._execute_function_call(function_name, args)
+            
+            # Parse the function result to extract actual data
+            parsed_result = self._parse_function_result(function_result)
+            
+            # Remember where the transaction history left off for the "more" command
+            if function_name == "get_transaction_history":
+                next_cursor = parsed_result.get("next_cursor") if isinstance(parsed_result, dict) else None
+                self.history_next_page = {**dict(args or {}), "cursor": next_cursor} if next_cursor else None
+            
+            # Format the result using the ResponseFormatter
+            return ResponseFormatter.format_response(function_name, parsed_result)
         except Exception as e:
-            return f"Error processing response: {str(e)}"
+            return f"I'm sorry, I couldn't complete that action: {str(e)}"
+    
+    @staticmethod
+    def _assemble_reply(reply):
+        """Join the streamed text and the function results into the final reply."""
+        result = []
+        text = "".join(reply["text"]).strip()
+        if text:
+            result.append(text)
+        result.extend(reply["tools"])
+        
+        # For simple greetings with no function calls, provide a friendly response
+        if not reply["has_function_call"] and not result:
+            return "Hello! How can I help with your banking needs today?"
+        
+        # If there's an empty function call, provide a generic response
+        if reply["has_function_call"] and not result:
+            return "How can I help you with your banking needs today?"
+        
+        return "\n".join(result)
     
     def _parse_function_result(self, result):
         """Parse the function result to extract the actual data."""
@@ -187,17 +233,25 @@ class InteractiveBankingAssistant:
                     "error": True
                 }
                 
-            # Create a new dict from args to avoid modifying the original
-            mcp_args = dict(args) if args else {}
+            # Copy the args into plain Python values, which also avoids modifying the original
+            mcp_args = _to_plain(args) if args else {}
             
             # Add user_id automatically if not provided and needed
-            if function_name != "answer_banking_question" and "user_id" not in mcp_args:
-                mcp_args["user_id"] = self.user_id
+            if function_name != "answer_banking_question":
+                if self.pin_user:
+                    # The model must not act for anyone but the authenticated user
+                    mcp_args["user_id"] = self.user_id
+                elif "user_id" not in mcp_args:
+                    mcp_args["user_id"] = self.user_id
+            
+            # One key per function call, so the pool retrying it never moves money twice
+            if function_name in IDEMPOTENT_TOOLS and "idempotency_key" not in mcp_args:
+                mcp_args["idempotency_key"] = str(uuid.uuid4())
             
             print(f"\n🔧 Executing function: {function_name} with args: {mcp_args}")
                 
-            # Call the function through MCP
-            result = await self.session.call_tool(function_name, mcp_args)
+            # Call the function through the least busy MCP session
+            result = await self.pool.call_tool(function_name, mcp_args)
             
             # Format the result for logging
             result_str = self._format_result_for_logging(result)
@@ -238,6 +292,20 @@ class InteractiveBankingAssistant:
     
     async def send_message(self, user_input):
         """Send a message to the assistant and get a response."""
+        assistant_response = ""
+        async for kind, content in self.stream_message(user_input):
+            if kind == "done":
+                assistant_response = content
+        return assistant_response
+    
+    async def stream_message(self, user_input):
+        """
+        Send a message to the assistant and stream the response as it is generated.
+
+        Yields ``(kind, content)`` tuples: ``("text", delta)`` for each piece of the
+        model's reply, ``("tool", text)`` for each formatted function result, and a
+        final ``("done", reply)`` with the complete reply as ``send_message`` returns it.
+        """
         # Print user input for debugging
         print(f"\n💬 User: {user_input}")
         
@@ -248,42 +316,58 @@ class InteractiveBankingAssistant:
         command, arg = IntentDetector.detect_command(user_input)
         if command:
             if command == "exit":
-                return "Goodbye! Thank you for using RBC Banking Agent."
+                yield ("done", "Goodbye! Thank you for using RBC Banking Agent.")
+                return
             elif command == "clear":
-                self.conversation_history = []
-                return "Conversation history cleared."
+                self.conversation_history.clear()
+                yield ("done", "Conversation history cleared.")
+                return
             elif command == "user" and arg:
+                if self.pin_user:
+                    yield ("done", "The user can't be changed in this session.")
+                    return
                 self.user_id = arg
-                return f"User ID changed to: {self.user_id}"
+                self.history_next_page = None
+                self._model = None
+                yield ("done", f"User ID changed to: {self.user_id}")
+                return
+            elif command == "more":
+                # Load the next page of the last transaction history without asking the model
+                if self.history_next_page:
+                    assistant_response = await self._run_tool("get_transaction_history", self.history_next_page)
+                else:
+                    assistant_response = "There are no more transactions to show."
+                self.conversation_history.append({"role": "assistant", "content": assistant_response})
+                yield ("done", assistant_response)
+                return
         
         # For non-greetings, build the prompt with history
         try:
-            # Create a model with the tools from config
-            tool_config = [{
-                "function_declarations": TOOL_DEFINITIONS
-            }]
-            
-            # Create a model with the tools
-            model = genai.GenerativeModel(
-                model_name=MODEL_CONFIG["model_name"],
-                generation_config=genai.GenerationConfig(
-                    temperature=MODEL_CONFIG["temperature"]
-                ),
-                tools=tool_config,
-                tool_config={"function_calling_config": MODEL_CONFIG["tool_calling_config"]}
-            )
-            
             # Let the LLM handle all queries, including short ones and account queries
             
-            # Generate content with system instructions from config
-            system_instructions = SYSTEM_INSTRUCTIONS.format(user_id=self.user_id)
+            # The system instructions are part of the cached model, so only the
+            # user input is sent
             response = await asyncio.to_thread(
-                model.generate_content,
-                [system_instructions, user_input]
+                self.model.generate_content,
+                user_input,
+                stream=True
             )
-                    
-            # Process and print response
-            assistant_response = await self._process_response(response)
+            
+            # Pull the chunks off the blocking stream without blocking the loop
+            chunks = iter(response)
+            reply = {"text": [], "tools": [], "has_function_call": False}
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                if hasattr(chunk, 'parts'):
+                    async for event in self._process_parts(chunk.parts, reply):
+                        yield event
+                elif chunk.text:
+                    reply["text"].append(chunk.text)
+                    yield ("text", chunk.text)
+            
+            assistant_response = self._assemble_reply(reply)
             
             print("\n🔁 Assistant:")
             print(assistant_response)
@@ -291,12 +375,12 @@ class InteractiveBankingAssistant:
             # Add assistant response to history
             self.conversation_history.append({"role": "assistant", "content": assistant_response})
             
-            return assistant_response
+            yield ("done", assistant_response)
             
         except Exception as e:
             error_msg = f"I'm sorry, I couldn't complete that action: {str(e)}"
             print(f"\n❌ {error_msg}")
-            return error_msg
+            yield ("done", error_msg)
     
     
     async def run_interactive(self):
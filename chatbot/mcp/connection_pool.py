@@ -0,0 +1,256 @@
+"""Pool of MCP client sessions shared by the banking assistants."""
+import asyncio
+import itertools
+from typing import Any, Dict, List, Optional
+
+import anyio
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+from chatbot.config import MCP_POOL_SIZE, MCP_HEALTH_CHECK_INTERVAL, MCP_CONNECT_TIMEOUT
+
+# Errors that mean the SSE stream behind a session is gone
+CONNECTION_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    ConnectionError,
+    OSError,
+    asyncio.TimeoutError,
+)
+
+
+class _PooledConnection:
+    """One SSE stream and the MCP session running over it.
+
+    The stream and the session are entered and exited inside a dedicated task,
+    because the SSE client's task group must be closed by the task that opened it.
+    """
+
+    def __init__(self, url: str, index: int):
+        self.url = url
+        self.index = index
+        self.session: Optional[ClientSession] = None
+        self.in_flight = 0
+        self.reconnecting = False
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._error: Optional[BaseException] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.session is not None
+
+    async def _run(self):
+        try:
+            async with sse_client(self.url) as (read_stream, write_stream):
+                async with ClientSession(read_stream, write_stream) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._stop.wait()
+        except Exception as e:
+            self._error = e
+            print(f"[MCP] Connection {self.index} closed: {e}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def connect(self, timeout: float):
+        """Open the stream and wait until the session is initialized."""
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._error = None
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            await self.close(cancel=True)
+            raise ConnectionError(f"Timed out connecting to {self.url}")
+        if not self.healthy:
+            raise ConnectionError(f"Could not connect to {self.url}: {self._error}")
+
+    def mark_broken(self):
+        """Forget the session so no new calls are dispatched to it."""
+        self.session = None
+        self._stop.set()
+
+    async def close(self, cancel: bool = False):
+        """
+        Close the session and the stream.
+
+        :param cancel: Cancel the connection task instead of letting it exit cleanly,
+            for streams that never finished connecting.
+        """
+        self._stop.set()
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            if cancel:
+                task.cancel()
+            try:
+                # wait_for cancels the task if it does not exit in time
+                await asyncio.wait_for(task, MCP_CONNECT_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+        self.session = None
+
+
+class MCPConnectionPool:
+    """A fixed number of MCP sessions to the same server.
+
+    Tool calls go to the healthy session with the fewest calls in flight, ties
+    broken round-robin.  Sessions whose stream drops are reconnected in the
+    background, and a periodic ping finds streams that died silently.
+    """
+
+    def __init__(self, url: str, size: int = MCP_POOL_SIZE,
+                 health_check_interval: float = MCP_HEALTH_CHECK_INTERVAL,
+                 connect_timeout: float = MCP_CONNECT_TIMEOUT):
+        """
+        :param url: The SSE endpoint of the MCP server.
+        :param size: The number of sessions to keep open.
+        :param health_check_interval: Seconds between two rounds of pings.
+        :param connect_timeout: Seconds to wait for a session to be initialized.
+        """
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.health_check_interval = health_check_interval
+        self.connections: List[_PooledConnection] = [
+            _PooledConnection(url, i) for i in range(max(1, size))
+        ]
+        self._next = itertools.count()
+        self._health_task: Optional[asyncio.Task] = None
+        self._reconnect_tasks: set = set()
+
+    async def start(self):
+        """Open all sessions and start the health checks."""
+        results = await asyncio.gather(
+            *(conn.connect(self.connect_timeout) for conn in self.connections),
+            return_exceptions=True
+        )
+        failed = [conn for conn, result in zip(self.connections, results)
+                  if isinstance(result, BaseException)]
+        # Sessions that could not connect yet keep retrying in the background, so a
+        # server that starts after the client does not need a client restart
+        for conn in failed:
+            self._schedule_reconnect(conn)
+        self._health_task = asyncio.create_task(self._health_check_loop())
+        print(f"[MCP] Connected {len(self.connections) - len(failed)}/{len(self.connections)} sessions to {self.url}")
+
+    async def close(self):
+        """Stop the health checks and close all sessions."""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for task in list(self._reconnect_tasks):
+            task.cancel()
+        await asyncio.gather(*(conn.close() for conn in self.connections), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the state of every session in the pool."""
+        return {
+            "size": len(self.connections),
+            "healthy": sum(conn.healthy for conn in self.connections),
+            "in_flight": [conn.in_flight for conn in self.connections],
+        }
+
+    def _pick(self) -> Optional[_PooledConnection]:
+        """Pick the healthy session with the fewest calls in flight."""
+        count = len(self.connections)
+        start = next(self._next) % count
+        best = None
+        for offset in range(count):
+            conn = self.connections[(start + offset) % count]
+            if conn.healthy and (best is None or conn.in_flight < best.in_flight):
+                best = conn
+        return best
+
+    async def _acquire(self) -> _PooledConnection:
+        conn = self._pick()
+        if conn is not None:
+            return conn
+        # Every session is down, so reconnect one right away instead of waiting
+        # for the background reconnects.  Only one is tried, so a caller waits at
+        # most one connect timeout before giving up.
+        conn = next((conn for conn in self.connections if not conn.reconnecting), None)
+        if conn is not None:
+            await self._reconnect(conn, retry=False)
+        conn = self._pick()
+        if conn is None:
+            raise ConnectionError(f"No MCP session to {self.url} is available")
+        return conn
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None):
+        """
+        Call a tool on the least busy session, retrying once on another session
+        when the stream of the first one turns out to be broken.
+
+        :param name: The name of the tool.
+        :param arguments: The arguments of the tool.
+        :return: The tool result returned by the MCP session.
+        """
+        attempts = 2
+        for attempt in range(attempts):
+            conn = await self._acquire()
+            conn.in_flight += 1
+            try:
+                return await conn.session.call_tool(name, arguments)
+            except CONNECTION_ERRORS as e:
+                print(f"[MCP] Session {conn.index} failed during {name}: {e!r}")
+                self._schedule_reconnect(conn)
+                if attempt == attempts - 1:
+                    raise
+            finally:
+                conn.in_flight -= 1
+
+    def _schedule_reconnect(self, conn: _PooledConnection):
+        if conn.reconnecting:
+            return
+        conn.mark_broken()
+        task = asyncio.create_task(self._reconnect(conn))
+        self._reconnect_tasks.add(task)
+        task.add_done_callback(self._reconnect_tasks.discard)
+
+    async def _reconnect(self, conn: _PooledConnection, retry: bool = True):
+        """
+        Reopen a session.
+
+        :param conn: The session to reopen.
+        :param retry: Keep retrying with exponential backoff until the server is
+            reachable again, instead of giving up after the first failure.
+        """
+        if conn.reconnecting:
+            return
+        conn.reconnecting = True
+        delay = 0.5
+        try:
+            await conn.close()
+            while True:
+                try:
+                    await conn.connect(self.connect_timeout)
+                    print(f"[MCP] Session {conn.index} reconnected")
+                    return
+                except ConnectionError as e:
+                    print(f"[MCP] Reconnecting session {conn.index} failed: {e}")
+                    if not retry:
+                        return
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.health_check_interval)
+        finally:
+            conn.reconnecting = False
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for conn in self.connections:
+                if conn.reconnecting:
+                    continue
+                if not conn.healthy:
+                    self._schedule_reconnect(conn)
+                    continue
+                try:
+                    await asyncio.wait_for(conn.session.send_ping(), self.connect_timeout)
+                except Exception as e:
+                    print(f"[MCP] Health check of session {conn.index} failed: {e!r}")
+                    self._schedule_reconnect(conn)
@@ -3,7 +3,9 @@ from dotenv import load_dotenv
 from decimal import Decimal
 import os
 import sys
+import base64
 import datetime
+import json
 
 # Add the parent directory to the Python path to import from src and chatbot
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
@@ -12,10 +14,11 @@ print(f"Added to Python path: {parent_dir}")
 
 # Import RAG components
 from chatbot.rag.rag_chatbot import RBCChatbot
+from chatbot.rag.vector_store import get_embeddings
 
 # Import the actual database functions
-from chatbot.account import list_accounts, list_transfer_target_accounts, transfer_between_accounts
-from chatbot.database import init_db
+from chatbot.account import list_accounts, get_account, list_transfer_target_accounts, atransfer_between_accounts, abatch_transfer_between_accounts
+from chatbot.database import init_db, load_transaction_history, load_balance_at_date, load_account_summary
 from chatbot.models import Account
 
 # Load environment variables from .env file
@@ -34,8 +37,9 @@ from chatbot.config import MCP_NAME, MCP_HOST, MCP_PORT, DEFAULT_USER_ID
 mcp = FastMCP(name=MCP_NAME, host=MCP_HOST, port=MCP_PORT)
 
 # RAG Tool: Answer questions using the RAG system
+# It is async, so a slow generation does not hold a worker thread that other tools need
 @mcp.tool()
-def answer_banking_question(question: str) -> dict:
+async def answer_banking_question(question: str) -> dict:
     """
     Answer a banking question using the RAG system with RBC documentation.
     Only for banking, financial services, or RBC-related questions.
@@ -45,13 +49,31 @@ def answer_banking_question(question: str) -> dict:
     
     # Process the question - the model should determine if it's banking-related
     # based on the system instructions
-    result = chatbot.answer_question(question)
+    result = await chatbot.aanswer_question(question)
     print(f"[RAG] Found answer with {len(result['sources'])} sources")
     return {
         "answer": result["answer"],
         "sources": result["sources"]
     }
 
+# Hit rate of the RAG answer cache
+@mcp.resource("metrics://rag-cache")
+def rag_cache_metrics() -> str:
+    """Hit and miss counts of the cache of answers to banking questions."""
+    return json.dumps(chatbot.answer_cache.stats())
+
+# Questions being answered and waiting for a slot on the async RAG path
+@mcp.resource("metrics://rag-queue")
+def rag_queue_metrics() -> str:
+    """How many banking questions are being answered and how many wait for a concurrency slot."""
+    return json.dumps(chatbot.rag_queue_stats())
+
+# Batching and hit rate of the query embeddings
+@mcp.resource("metrics://query-embeddings")
+def query_embedding_metrics() -> str:
+    """How many query embeddings were served from memory, and how many were computed per call to the model."""
+    return json.dumps(get_embeddings().stats())
+
 # Tool 1: List all accounts belonging to a user
 @mcp.tool()
 def list_user_accounts(user_id: str) -> list[dict]:
@@ -71,10 +93,16 @@ def list_target_accounts(user_id: str, from_account: str) -> list[dict]:
     return [account.__dict__ for account in accounts]
 
 # Tool 3: Transfer funds between two accounts
+# It is async, so the event loop keeps taking other transfers while the writer commits them together
 @mcp.tool()
-def transfer_funds(user_id: str, from_account: str, to_account: str, amount: str) -> str:
-    """Transfer funds from one account to another."""
-    print(f"[DEBUG] transfer_funds called with user_id={user_id}, from_account={from_account}, to_account={to_account}, amount={amount}")
+async def transfer_funds(user_id: str, from_account: str, to_account: str, amount: str,
+                   idempotency_key: str = "") -> str:
+    """
+    Transfer funds from one account to another.
+    A retried call with the same idempotency_key returns the original result
+    instead of transferring again.
+    """
+    print(f"[DEBUG] transfer_funds called with user_id={user_id}, from_account={from_account}, to_account={to_account}, amount={amount}, idempotency_key={idempotency_key}")
     try:
         # Convert amount to Decimal, handling any formatting issues
         clean_amount = amount.replace('$', '').replace(',', '')
@@ -86,97 +114,182 @@ def transfer_funds(user_id: str, from_account: str, to_account: str, amount: str
         print(f"[DEBUG] to_account: {to_account} (type: {type(to_account)})")
         
         # Call the transfer function
-        transfer_between_accounts(user_id, from_account, to_account, decimal_amount)
-        return f"✅ Transferred ${clean_amount} from {from_account} to {to_account}."
+        result = await atransfer_between_accounts(user_id, from_account, to_account, decimal_amount,
+                                                  idempotency_key=idempotency_key or None)
+        return (f"✅ Transferred ${clean_amount} from {from_account} to {to_account}. "
+                f"New balance of {from_account}: ${result.from_account_balance}.")
     except Exception as e:
         print(f"[ERROR] Transfer failed: {str(e)}")
         return f"❌ Transfer failed: {str(e)}"
 
+# Tool 3b: Apply many transfers in one transaction
+@mcp.tool()
+async def transfer_funds_batch(user_id: str, transfers: list[dict], idempotency_key: str = "") -> dict:
+    """
+    Transfer funds between several pairs of accounts at once.
+    Each transfer is a dict with from_account, to_account and amount.
+    Either all transfers are applied or none of them is.
+    A retried call with the same idempotency_key returns the original result.
+    """
+    print(f"[DEBUG] transfer_funds_batch called with user_id={user_id}, transfers={transfers}, idempotency_key={idempotency_key}")
+    try:
+        legs = []
+        for transfer in transfers:
+            # Convert amount to Decimal, handling any formatting issues
+            clean_amount = str(transfer["amount"]).replace('$', '').replace(',', '')
+            legs.append((transfer["from_account"], transfer["to_account"], Decimal(clean_amount)))
+        
+        results = await abatch_transfer_between_accounts(user_id, legs, idempotency_key or None)
+        return {
+            "transfers": [
+                {
+                    "transaction_id": result.transaction_number,
+                    "from_account": result.from_account,
+                    "to_account": result.to_account,
+                    "amount": str(result.amount),
+                    "from_account_balance": str(result.from_account_balance),
+                    "to_account_balance": str(result.to_account_balance)
+                }
+                for result in results
+            ]
+        }
+    except Exception as e:
+        print(f"[ERROR] Batch transfer failed: {str(e)}")
+        return {"error": f"Batch transfer failed, no transfers were made: {str(e)}"}
+
 # Tool 4: Get account balance
 @mcp.tool()
 def get_account_balance(user_id: str, account_number: str) -> dict:
     """Get the balance of a specific account."""
     print(f'[DEBUG] get_account_balance called with user_id={user_id}, account_number={account_number}')
     
-    # Find the account in the user's accounts
-    accounts = list_accounts(user_id)
-    for account in accounts:
-        if account.account_number == account_number:
-            return {
-                "account_number": account.account_number,
-                "account_name": account.account_name,
-                "balance": str(account.balance),
-                "currency": "CAD"
-            }
+    # Look the account up in the user's cached accounts
+    account = get_account(user_id, account_number)
+    if account is not None:
+        return {
+            "account_number": account.account_number,
+            "account_name": account.account_name,
+            "balance": str(account.balance),
+            "currency": "CAD"
+        }
     
     return {"error": f"Account {account_number} not found."}
 
+# Opaque keyset cursors for paging through the transaction history
+def _encode_cursor(transaction) -> str:
+    key = json.dumps([transaction.transaction_datetime, transaction.transaction_number])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    transaction_datetime, transaction_number = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return transaction_datetime, transaction_number
+
 # Tool 5: Get transaction history
 @mcp.tool()
-def get_transaction_history(user_id: str, account_number: str, days: int = 30) -> list[dict]:
-    """Get the transaction history for a specific account."""
-    print(f"[DEBUG] get_transaction_history called with user_id={user_id}, account_number={account_number}, days={days}")
-    
-    # Connect to the database to get transaction history
-    import sqlite3
-    from chatbot.database import DB_FILE
+def get_transaction_history(user_id: str, account_number: str, days: int = 30,
+                            limit: int = 5, cursor: str = "") -> dict:
+    """
+    Get the transaction history for a specific account, newest first, one page at a time.
+    Pass the returned next_cursor as cursor to get the next page.
+    """
+    print(f"[DEBUG] get_transaction_history called with user_id={user_id}, account_number={account_number}, days={days}, limit={limit}, cursor={cursor}")
     
-    con = sqlite3.connect(DB_FILE)
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
+    try:
+        before = _decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return {"error": "Invalid cursor."}
     
     # Calculate the date range
     today = datetime.datetime.now()
     start_date = (today - datetime.timedelta(days=days)).isoformat()
     
-    # Query for transactions with balances
-    cur.execute("""
-        SELECT 
-            TransactionNumber, 
-            TransferDateTime, 
-            CASE 
-                WHEN FromAccountNumber = :account_number THEN 'debit' 
-                ELSE 'credit' 
-            END as transaction_type,
-            CASE 
-                WHEN FromAccountNumber = :account_number THEN -Amount 
-                ELSE Amount 
-            END as amount,
-            CASE 
-                WHEN FromAccountNumber = :account_number THEN 'Transfer to ' || ToAccountNumber
-                ELSE 'Transfer from ' || FromAccountNumber
-            END as description,
-            CASE 
-                WHEN FromAccountNumber = :account_number THEN FromAccountBalance
-                ELSE ToAccountBalance
-            END as balance_after
-        FROM Transfers
-        WHERE (FromAccountNumber = :account_number OR ToAccountNumber = :account_number)
-        AND TransferDateTime >= :start_date
-        ORDER BY TransferDateTime DESC
-    """, {"account_number": account_number, "start_date": start_date})
-    
-    rows = cur.fetchall()
+    # Query one more transaction than asked for to know if there is another page
+    limit = max(1, min(int(limit), 100))
+    history = load_transaction_history(account_number, start_date, limit + 1, before)
+    page = history[:limit]
     
     # Create transaction objects using stored balances
     transactions = []
     
-    for row in rows:
-        amount = Decimal(str(row['amount']))
-        
+    for item in page:
         transaction = {
-            "transaction_id": row['TransactionNumber'],
-            "date": row['TransferDateTime'].split('T')[0],  # Just the date part
-            "description": row['description'],
-            "amount": str(amount),
-            "transaction_type": row['transaction_type'],
-            "balance_after": str(row['balance_after'])
+            "transaction_id": item.transaction_number,
+            "date": item.transaction_datetime.split('T')[0],  # Just the date part
+            "description": item.description,
+            "amount": str(item.amount),
+            "transaction_type": item.transaction_type,
+            "balance_after": str(item.balance_after)
         }
         transactions.append(transaction)
     
-    con.close()
     print(f"[DEBUG] Returning: {len(transactions)} transactions")
-    return transactions
+    return {
+        "account_number": account_number,
+        "transactions": transactions,
+        "next_cursor": _encode_cursor(page[-1]) if len(history) > limit else None
+    }
+
+# Tool 6: Get the balance of an account at the end of a day
+@mcp.tool()
+def get_balance_at_date(user_id: str, account_number: str, date: str) -> dict:
+    """Get the balance of a specific account at the end of a day, given as YYYY-MM-DD."""
+    print(f"[DEBUG] get_balance_at_date called with user_id={user_id}, account_number={account_number}, date={date}")
+    
+    try:
+        balance_date = datetime.date.fromisoformat(date).isoformat()
+    except ValueError:
+        return {"error": f"Invalid date {date}, expected YYYY-MM-DD."}
+    
+    # Only answer for the user's own accounts
+    account = get_account(user_id, account_number)
+    if account is None:
+        return {"error": f"Account {account_number} not found."}
+    
+    balance = load_balance_at_date(account_number, balance_date)
+    return {
+        "account_number": account.account_number,
+        "account_name": account.account_name,
+        "date": balance_date,
+        "balance": str(balance),
+        "currency": "CAD"
+    }
+
+# Tool 7: Summarize the activity of an account over a period
+@mcp.tool()
+def get_account_summary(user_id: str, account_number: str, start_date: str, end_date: str = "") -> dict:
+    """
+    Summarize a specific account between two dates, given as YYYY-MM-DD: the opening
+    and closing balances, the total money in and out and the number of transactions.
+    The end date defaults to today.
+    """
+    print(f"[DEBUG] get_account_summary called with user_id={user_id}, account_number={account_number}, start_date={start_date}, end_date={end_date}")
+    
+    try:
+        start = datetime.date.fromisoformat(start_date)
+        end = datetime.date.fromisoformat(end_date) if end_date else datetime.date.today()
+    except ValueError:
+        return {"error": "Invalid date, expected YYYY-MM-DD."}
+    if start > end:
+        return {"error": "The start date must not be after the end date."}
+    
+    # Only answer for the user's own accounts
+    account = get_account(user_id, account_number)
+    if account is None:
+        return {"error": f"Account {account_number} not found."}
+    
+    summary = load_account_summary(account_number, start.isoformat(), end.isoformat())
+    return {
+        "account_number": account.account_number,
+        "account_name": account.account_name,
+        "start_date": summary.start_date,
+        "end_date": summary.end_date,
+        "opening_balance": str(summary.opening_balance),
+        "closing_balance": str(summary.closing_balance),
+        "total_in": str(summary.total_in),
+        "total_out": str(summary.total_out),
+        "transaction_count": summary.transaction_count,
+        "currency": "CAD"
+    }
 
 # Run the MCP server using SSE transport
 if __name__ == "__main__":
@@ -0,0 +1,10 @@
+-- Covering indexes for the transaction history of an account.  Each branch of
+-- the history query seeks to one account and walks its transfers in date order
+-- without touching the Transfers table.
+CREATE INDEX IF NOT EXISTS IX_Transfers_From_DateTime
+  ON Transfers (FromAccountNumber, TransferDateTime, TransactionNumber,
+                ToAccountNumber, Amount, FromAccountBalance);
+
+CREATE INDEX IF NOT EXISTS IX_Transfers_To_DateTime
+  ON Transfers (ToAccountNumber, TransferDateTime, TransactionNumber,
+                FromAccountNumber, Amount, ToAccountBalance);
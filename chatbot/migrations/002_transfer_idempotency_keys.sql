@@ -0,0 +1,8 @@
+-- Key sent by the client with a transfer request, so a retried request is
+-- answered with the original result instead of moving the money again.  Each
+-- leg of a request stores the key followed by "/" and the leg's position.
+ALTER TABLE Transfers ADD COLUMN IdempotencyKey TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS UX_Transfers_IdempotencyKey
+  ON Transfers (IdempotencyKey)
+  WHERE IdempotencyKey IS NOT NULL;
@@ -0,0 +1,24 @@
+-- The transaction history is read from the per-account ledger in Transactions,
+-- which every transfer now writes both legs of.  The covering index lets a
+-- history page seek to one account and walk its legs in date order.
+CREATE INDEX IF NOT EXISTS IX_Transactions_Account_DateTime
+  ON Transactions (AccountNumber, TransactionDateTime, TransactionNumber,
+                   TransactionTypeCode, Amount, OtherAccountNumber, BalanceAfter);
+
+-- Backfill the ledger from the transfers recorded before it was written
+INSERT OR IGNORE INTO Transactions (
+  TransactionNumber, AccountNumber, OtherAccountNumber,
+  TransactionDateTime, TransactionTypeCode, Amount, BalanceAfter
+)
+SELECT TransactionNumber, FromAccountNumber, ToAccountNumber,
+       TransferDateTime, 'debit', -Amount, FromAccountBalance
+FROM Transfers
+UNION ALL
+SELECT TransactionNumber, ToAccountNumber, FromAccountNumber,
+       TransferDateTime, 'credit', Amount, ToAccountBalance
+FROM Transfers;
+
+-- The history no longer reads Transfers by account, so its indexes only slow
+-- down writes
+DROP INDEX IF EXISTS IX_Transfers_From_DateTime;
+DROP INDEX IF EXISTS IX_Transfers_To_DateTime;
@@ -0,0 +1,40 @@
+-- One row per account and day with activity, kept up to date by every transfer,
+-- so balances at a date and period summaries are read from a few rows instead
+-- of replaying the ledger.  TotalOut is positive.
+CREATE TABLE IF NOT EXISTS AccountDailyBalances (
+  AccountNumber     TEXT    NOT NULL,
+  BalanceDate       TEXT    NOT NULL,
+  OpeningBalance    NUMERIC NOT NULL,
+  ClosingBalance    NUMERIC NOT NULL,
+  TotalIn           NUMERIC NOT NULL,
+  TotalOut          NUMERIC NOT NULL,
+  TransactionCount  INTEGER NOT NULL,
+  CONSTRAINT PK_AccountDailyBalances
+    PRIMARY KEY (AccountNumber, BalanceDate),
+  FOREIGN KEY(AccountNumber) REFERENCES Accounts(AccountNumber)
+) WITHOUT ROWID;
+
+-- Backfill the snapshots from the ledger, in the order the entries were written
+INSERT OR REPLACE INTO AccountDailyBalances (
+  AccountNumber, BalanceDate, OpeningBalance, ClosingBalance,
+  TotalIn, TotalOut, TransactionCount
+)
+SELECT AccountNumber, BalanceDate, OpeningBalance, ClosingBalance,
+       TotalIn, TotalOut, TransactionCount
+FROM (
+  SELECT AccountNumber,
+         substr(TransactionDateTime, 1, 10) AS BalanceDate,
+         FIRST_VALUE(BalanceAfter - Amount) OVER day AS OpeningBalance,
+         LAST_VALUE(BalanceAfter) OVER day AS ClosingBalance,
+         SUM(CASE WHEN Amount > 0 THEN Amount ELSE 0 END) OVER day AS TotalIn,
+         SUM(CASE WHEN Amount < 0 THEN -Amount ELSE 0 END) OVER day AS TotalOut,
+         COUNT(*) OVER day AS TransactionCount,
+         ROW_NUMBER() OVER day AS EntryNumber
+  FROM Transactions
+  WINDOW day AS (
+    PARTITION BY AccountNumber, substr(TransactionDateTime, 1, 10)
+    ORDER BY TransactionDateTime, rowid
+    ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+  )
+)
+WHERE EntryNumber = 1;
@@ -0,0 +1,56 @@
+"""Cache of the Gemini models used by the banking assistant."""
+import json
+from functools import lru_cache
+
+import google.generativeai as genai
+from google.generativeai.types import content_types
+
+from chatbot.config import SESSION_POOL_SIZE
+from chatbot.config_client import SYSTEM_INSTRUCTIONS, TOOL_DEFINITIONS, MODEL_CONFIG
+
+# Cache keys of the model configuration and the tool set, computed once at startup
+_CONFIG_KEY = json.dumps(MODEL_CONFIG, sort_keys=True)
+_TOOLS_KEY = json.dumps(TOOL_DEFINITIONS, sort_keys=True)
+
+
+@lru_cache(maxsize=None)
+def _model_settings(config_key: str, tools_key: str) -> dict:
+    """
+    Build the model settings that are the same for every user.
+
+    The tool declarations and the tool config are converted to their protobuf
+    form here, so models built from these settings skip the conversion.
+    """
+    config = json.loads(config_key)
+    tools = json.loads(tools_key)
+    return {
+        "model_name": config["model_name"],
+        "generation_config": genai.GenerationConfig(temperature=config["temperature"]),
+        "tools": content_types.to_function_library([{"function_declarations": tools}]),
+        "tool_config": content_types.to_tool_config(
+            {"function_calling_config": config["tool_calling_config"]}
+        ),
+    }
+
+
+@lru_cache(maxsize=SESSION_POOL_SIZE)
+def _build_model(config_key: str, tools_key: str,
+                 system_instruction: str) -> genai.GenerativeModel:
+    return genai.GenerativeModel(
+        system_instruction=system_instruction,
+        **_model_settings(config_key, tools_key)
+    )
+
+
+def get_model(user_id: str) -> genai.GenerativeModel:
+    """
+    Get the model that serves the specified user.
+
+    The system instructions of the user are passed as the model's native system
+    instruction, so they do not need to be sent along with every message.
+
+    :param user_id: The user the model is acting for.
+    :return: A model configured with ``MODEL_CONFIG`` and ``TOOL_DEFINITIONS``.
+    """
+    system_instruction = SYSTEM_INSTRUCTIONS.format(user_id=user_id)
+    return _build_model(_CONFIG_KEY, _TOOLS_KEY, system_instruction)
@@ -22,4 +22,78 @@ class Account:
         self.balance = Decimal("0")
     
     def __str__(self):
-        return f"{self.account_name} ({self.account_number}): {self.balance}"
\ No newline at end of file
+        return f"{self.account_name} ({self.account_number}): {self.balance}"
+
+@dataclass
+class Transaction:
+    """Represent one side of a transfer as seen from one account"""
+
+    transaction_number: str
+    """The unique number of the transfer."""
+
+    transaction_datetime: str
+    """When the transfer happened, in ISO 8601 format."""
+
+    transaction_type: str
+    """Either 'debit' or 'credit'."""
+
+    amount: Decimal
+    """The amount of the transaction, negative for debits."""
+
+    description: str
+    """A short description of the transaction."""
+
+    balance_after: Decimal
+    """The balance of the account after the transaction."""
+
+
+@dataclass
+class TransferResult:
+    """Represent a committed transfer and the balances it left behind"""
+
+    transaction_number: str
+    """The unique number of the transfer."""
+
+    from_account: str
+    """The account number the fund was transferred from."""
+
+    to_account: str
+    """The account number the fund was transferred to."""
+
+    amount: Decimal
+    """The amount that was transferred."""
+
+    from_account_balance: Decimal
+    """The balance of the source account after the transfer."""
+
+    to_account_balance: Decimal
+    """The balance of the destination account after the transfer."""
+
+
+@dataclass
+class AccountSummary:
+    """Represent the activity of an account over a period of days"""
+
+    account_number: str
+    """The account number of the account."""
+
+    start_date: str
+    """The first day of the period, in ISO 8601 format."""
+
+    end_date: str
+    """The last day of the period, in ISO 8601 format."""
+
+    opening_balance: Decimal
+    """The balance at the start of the first day."""
+
+    closing_balance: Decimal
+    """The balance at the end of the last day."""
+
+    total_in: Decimal
+    """The sum of the credits over the period."""
+
+    total_out: Decimal
+    """The sum of the debits over the period, as a positive amount."""
+
+    transaction_count: int
+    """The number of transactions over the period."""
@@ -1,21 +1,15 @@
-from chatbot.rag.document_loader import load_documents, split_documents
-from chatbot.rag.vector_store import create_vector_store
+from chatbot.rag.ingest import sync_vector_store
 from chatbot.rag.rag_chatbot import RBCChatbot
 import os
 import sys
 
 def initialize_database():
-    """Initialize the vector database if it doesn't exist"""
+    """Bring the vector database up to date with the documents directory"""
     from chatbot.config import VECTOR_DB_DIR, DOCS_DIRECTORY
     
-    if not os.path.exists(VECTOR_DB_DIR):
-        print("Creating vector database...")
-        documents = load_documents(DOCS_DIRECTORY)
-        chunks = split_documents(documents)
-        create_vector_store(chunks, VECTOR_DB_DIR)
-        print("Vector database created successfully!")
-    else:
-        print("Using existing vector database.")
+    # Only new, changed and removed documents are re-indexed
+    print("Syncing vector database...")
+    sync_vector_store(DOCS_DIRECTORY, VECTOR_DB_DIR)
 
 def main():
     # Initialize the database if needed
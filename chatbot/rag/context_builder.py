@@ -0,0 +1,80 @@
+"""Assembly of the retrieved chunks into a context that fits the prompt budget."""
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+from chatbot.config import RAG_CONTEXT_TOKEN_BUDGET
+
+# The overlap of consecutive chunks given to the splitter
+CHUNK_OVERLAP = 200
+
+# Shorter common runs are left alone, they are more likely chance than overlap
+_MIN_OVERLAP = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly count the tokens of English text, at about four characters each."""
+    return (len(text) + 3) // 4
+
+
+def _overlap(previous: str, text: str, max_overlap: int = CHUNK_OVERLAP) -> int:
+    """The length of the longest start of ``text`` that ``previous`` ends with."""
+    for length in range(min(max_overlap, len(previous), len(text)), _MIN_OVERLAP - 1, -1):
+        if previous.endswith(text[:length]):
+            return length
+    return 0
+
+
+def dedupe_chunks(documents: List[Document]) -> List[Document]:
+    """
+    Drop the text that retrieved chunks repeat from each other, keeping their order.
+
+    Chunks contained in an earlier chunk are dropped.  Consecutive chunks of a
+    source overlap, so the start or end of a chunk that repeats the end or start
+    of an earlier chunk of the same source is cut off.
+    """
+    kept: List[Document] = []
+    for document in documents:
+        text = document.page_content
+        source = document.metadata.get("source")
+        if any(text in other.page_content for other in kept):
+            continue
+        for other in kept:
+            if other.metadata.get("source") == source:
+                text = text[_overlap(other.page_content, text):]
+                text = text[:len(text) - _overlap(text, other.page_content)]
+        if text.strip():
+            kept.append(Document(page_content=text, metadata=document.metadata))
+    return kept
+
+
+def build_context(documents: List[Document],
+                  token_budget: int = RAG_CONTEXT_TOKEN_BUDGET) -> Tuple[str, List[Document]]:
+    """
+    Join the retrieved chunks into a context of at most ``token_budget`` tokens.
+
+    Chunks are taken best first after removing their overlap.  The chunk that
+    crosses the budget is cut at a word boundary, and the ones after it are left out.
+
+    :param documents: The retrieved chunks, best first.
+    :param token_budget: The maximum estimated number of tokens of the context.
+    :return: The context and the chunks it includes.
+    """
+    parts = []
+    used = []
+    remaining = token_budget
+    for document in dedupe_chunks(documents):
+        text = document.page_content.strip()
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            # Only worth including if a useful part of it fits
+            if remaining < 50:
+                break
+            text = text[:remaining * 4].rsplit(None, 1)[0] + " ..."
+            tokens = remaining
+        parts.append(text)
+        used.append(document)
+        remaining -= tokens + 1
+        if remaining <= 0:
+            break
+    return "\n\n".join(parts), used
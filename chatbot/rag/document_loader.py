@@ -1,51 +1,121 @@
 import os
 import glob
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from chatbot.config import INGEST_WORKERS, INGEST_BATCH_SIZE, INGEST_QUEUE_DEPTH
 
-def load_documents(directory_path):
-    """Load documents from a directory containing PDFs and text files"""
+def list_document_files(directory_path):
+    """List the PDFs and text files in a directory and its subdirectories"""
     # Get all PDF files in the directory
     pdf_files = glob.glob(os.path.join(directory_path, "**/*.pdf"), recursive=True)
     
     # Get all text files in the directory
     txt_files = glob.glob(os.path.join(directory_path, "**/*.txt"), recursive=True)
     
-    # Load each document file individually to handle errors gracefully
-    all_documents = []
-    
-    # Process PDF files
-    for pdf_file in pdf_files:
-        try:
-            loader = PyPDFLoader(pdf_file)
-            documents = loader.load()
-            all_documents.extend(documents)
-            print(f"Loaded {len(documents)} pages from {os.path.basename(pdf_file)}")
-        except Exception as e:
-            print(f"Error loading file {pdf_file}")
-            print(f"  Error details: {str(e)}")
-    
-    # Process text files
-    for txt_file in txt_files:
-        try:
-            loader = TextLoader(txt_file)
-            documents = loader.load()
-            all_documents.extend(documents)
-            print(f"Loaded text file: {os.path.basename(txt_file)}")
-        except Exception as e:
-            print(f"Error loading file {txt_file}")
-            print(f"  Error details: {str(e)}")
-    
-    print(f"Loaded {len(all_documents)} document pages in total")
-    return all_documents
+    return pdf_files + txt_files
+
+def _file_loader(file_path):
+    if file_path.lower().endswith(".pdf"):
+        return PyPDFLoader(file_path)
+    return TextLoader(file_path)
 
-def split_documents(documents, chunk_size=1000, chunk_overlap=200):
-    """Split documents into chunks for better processing"""
+def iter_file_chunks(file_path, chunk_size=1000, chunk_overlap=200):
+    """Load one PDF or text file a page at a time and yield its chunks"""
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         length_function=len,
     )
-    chunks = text_splitter.split_documents(documents)
-    print(f"Split into {len(chunks)} chunks")
-    return chunks
+    # Only one page of the file is held at a time
+    for page in _file_loader(file_path).lazy_load():
+        yield from text_splitter.split_documents([page])
+
+# The queue the worker processes of ``stream_files`` send their pieces on
+_pieces = None
+
+def _set_pieces_queue(pieces):
+    global _pieces
+    _pieces = pieces
+
+def _stream_file(function, file_path, piece_size):
+    """Send the items of one file to the parent in pieces, then whether it failed"""
+    try:
+        items = iter(function(file_path))
+        while piece := list(islice(items, piece_size)):
+            _pieces.put((file_path, piece, False, None))
+        _pieces.put((file_path, [], True, None))
+    except Exception as e:
+        # Parser errors are sent as text, since not every exception can be pickled
+        _pieces.put((file_path, [], True, str(e)))
+
+def stream_files(file_paths, function, workers=None, piece_size=INGEST_BATCH_SIZE,
+                 queue_depth=INGEST_QUEUE_DEPTH):
+    """
+    Apply a generator function to files in parallel worker processes, streaming
+    its items back in pieces as they are produced.
+
+    Workers send pieces over a bounded queue and pause when the caller falls
+    behind, so however large a file is, only about ``queue_depth`` pieces plus one
+    per worker are held at a time.  Pieces of different files interleave, but the
+    pieces of each file arrive in order.
+
+    :param file_paths: The paths of the files to process.
+    :param function: A module-level generator function called with the path of each file.
+    :param workers: The number of worker processes, defaults to ``INGEST_WORKERS``.
+    :param piece_size: The maximum number of items sent at a time.
+    :param queue_depth: The maximum number of pieces waiting for the caller.
+    :return: An iterator over ``(file_path, items, finished, error)``.  The last
+        piece of a file has ``finished`` set and no items, and ``error`` is the
+        error that stopped the file, or None when it was processed completely.
+    """
+    if workers is None:
+        workers = INGEST_WORKERS
+    file_paths = iter(file_paths)
+    if workers <= 1:
+        for file_path in file_paths:
+            try:
+                items = iter(function(file_path))
+                while piece := list(islice(items, piece_size)):
+                    yield file_path, piece, False, None
+            except Exception as e:
+                yield file_path, [], True, str(e)
+                continue
+            yield file_path, [], True, None
+        return
+
+    context = multiprocessing.get_context()
+    pieces = context.Queue(maxsize=queue_depth)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_set_pieces_queue, initargs=(pieces,)) as pool:
+        pending = {pool.submit(_stream_file, function, file_path, piece_size): file_path
+                   for file_path in islice(file_paths, workers * 2)}
+        try:
+            while pending:
+                try:
+                    file_path, piece, finished, error = pieces.get(timeout=1)
+                except queue.Empty:
+                    # A worker that died cannot report its file
+                    for future in [future for future in pending if future.done() and future.exception()]:
+                        yield pending.pop(future), [], True, str(future.exception())
+                    continue
+                if finished:
+                    for future in [future for future, path in pending.items() if path == file_path]:
+                        del pending[future]
+                    # Keep the workers busy while the caller handles this file
+                    for next_path in islice(file_paths, 1):
+                        pending[pool.submit(_stream_file, function, next_path, piece_size)] = next_path
+                yield file_path, piece, finished, error
+        finally:
+            # When the caller stops early, workers blocked on the full queue can
+            # only finish once it is drained
+            for future in pending:
+                future.cancel()
+            while not all(future.done() for future in pending):
+                try:
+                    pieces.get(timeout=0.1)
+                except queue.Empty:
+                    pass
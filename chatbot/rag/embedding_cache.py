@@ -0,0 +1,121 @@
+"""Persistent cache of embeddings keyed by the hash of the embedded text."""
+import hashlib
+import sqlite3
+import threading
+from array import array
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+# SQLite limits the number of bound parameters of one statement
+_LOOKUP_BATCH_SIZE = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings that are computed once and then read from an SQLite file.
+
+    Vectors are keyed by the model, the kind of text (documents and queries are
+    embedded differently by some models) and the SHA-256 of the text, so
+    re-indexing unchanged chunks or repeating a question costs no embedding call.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, cache_file: str,
+                 embed_queries: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        """
+        :param embeddings: The embeddings that compute the vectors missing from the cache.
+        :param model: The name of the embedding model, part of the cache key.
+        :param cache_file: The path of the SQLite cache file.
+        :param embed_queries: Embeds several queries in one call to the model, if it
+            can; otherwise queries are embedded one at a time.
+        """
+        self.embeddings = embeddings
+        self._embed_queries = embed_queries
+        self.model = model
+        self.cache_file = cache_file
+        self._con = sqlite3.connect(cache_file, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS Embeddings (
+              Model     TEXT NOT NULL,
+              Kind      TEXT NOT NULL,
+              TextHash  TEXT NOT NULL,
+              Vector    BLOB NOT NULL,
+              PRIMARY KEY (Model, Kind, TextHash)
+            ) WITHOUT ROWID
+            """
+        )
+        self._con.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, kind: str, hashes: List[str]) -> dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), _LOOKUP_BATCH_SIZE):
+                batch = hashes[start:start + _LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._con.execute(
+                    f"SELECT TextHash, Vector FROM Embeddings "
+                    f"WHERE Model = ? AND Kind = ? AND TextHash IN ({placeholders})",
+                    [self.model, kind, *batch]
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[text_hash] = array("f", vector).tolist()
+        return found
+
+    def _store(self, kind: str, vectors: dict[str, List[float]]):
+        with self._lock:
+            self._con.executemany(
+                "INSERT OR REPLACE INTO Embeddings (Model, Kind, TextHash, Vector) VALUES (?, ?, ?, ?)",
+                [(self.model, kind, text_hash, array("f", vector).tobytes())
+                 for text_hash, vector in vectors.items()]
+            )
+            self._con.commit()
+
+    def _embed(self, kind: str, texts: List[str],
+               compute: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        hashes = [self._hash(text) for text in texts]
+        cached = self._lookup(kind, list(set(hashes)))
+
+        # Embed each missing text once, even if it appears several times
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+        if missing:
+            vectors = compute(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(kind, computed)
+            cached.update(computed)
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return [cached[text_hash] for text_hash in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed document chunks, only computing the ones not cached yet."""
+        return self._embed("document", texts, self.embeddings.embed_documents)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries, computing the ones not cached yet in one call if the model allows it."""
+        if self._embed_queries is not None:
+            return self._embed("query", texts, self._embed_queries)
+        return self._embed("query", texts, lambda missing: [self.embeddings.embed_query(text)
+                                                            for text in missing])
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reading it from the cache if it was asked before."""
+        return self.embed_queries([text])[0]
+
+    def close(self):
+        """Close the cache file."""
+        with self._lock:
+            self._con.close()
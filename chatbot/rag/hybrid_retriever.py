@@ -0,0 +1,66 @@
+"""Retriever that fuses keyword and vector search results."""
+from typing import Any, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from chatbot.config import RAG_TOP_K
+from chatbot.rag.lexical_index import code_terms
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieve chunks by BM25 and by embedding similarity, fused by reciprocal rank.
+
+    Each chunk scores ``1 / (rrf_k + rank)`` in each result list it appears in,
+    so chunks found by both searches rise to the top.  A query with product-code
+    terms that are rare in the index, and that all appear in some chunks, is
+    answered from the keyword index alone, without embedding the query.  Terms
+    that most chunks contain, like the bank's name, say nothing about which
+    chunk is meant, so they never take that shortcut.
+    """
+
+    vector_store: VectorStore
+    """The vector store of the chunks."""
+
+    lexical_index: Any
+    """The ``LexicalIndex`` of the same chunks."""
+
+    k: int = RAG_TOP_K
+    """The number of chunks to return."""
+
+    fetch_k: int = 20
+    """The number of candidates taken from each search before fusing."""
+
+    rrf_k: int = 60
+    """Damps the weight of the top ranks in the fused score."""
+
+    max_term_fraction: float = 0.05
+    """The largest share of the chunks a term may appear in to take the keyword-only path."""
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        terms = code_terms(query)
+        if terms:
+            limit = self.max_term_fraction * len(self.lexical_index)
+            frequencies = self.lexical_index.document_frequencies(terms)
+            rare = [term for term in terms if 0 < frequencies[term] <= limit]
+            exact = self.lexical_index.search_all(rare, self.k) if rare else []
+            if exact:
+                return [document for document, _ in exact]
+
+        lexical = [document for document, _ in self.lexical_index.search(query, self.fetch_k)]
+        semantic = self.vector_store.similarity_search(query, k=self.fetch_k)
+
+        # Chunks are identified by their source and text, which both searches return
+        scores = {}
+        documents = {}
+        for results in (lexical, semantic):
+            for rank, document in enumerate(results):
+                key = (document.metadata.get("source"), document.page_content)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                documents.setdefault(key, document)
+        best = sorted(scores, key=scores.get, reverse=True)[:self.k]
+        return [documents[key] for key in best]
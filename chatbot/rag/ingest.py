@@ -0,0 +1,296 @@
+"""Incremental synchronisation of the document folder into the vector store."""
+import hashlib
+import json
+import os
+import queue
+import threading
+
+from chatbot.config import VECTOR_DB_DIR, VECTOR_BACKEND, INGEST_BATCH_SIZE, INGEST_QUEUE_DEPTH
+from chatbot.rag.document_loader import list_document_files, iter_file_chunks, stream_files
+from chatbot.rag.lexical_index import LexicalIndex
+from chatbot.rag.vector_store import (load_vector_store, get_embeddings, list_vector_store_ids,
+                                      add_embedded_documents)
+
+# Kept in the vector store directory, next to the index it describes
+MANIFEST_FILE = "ingest_manifest.json"
+
+
+def _manifest_path(persist_directory):
+    return os.path.join(persist_directory, MANIFEST_FILE)
+
+
+def load_manifest(persist_directory=None):
+    """
+    Load the manifest of the files ingested into the vector store.
+
+    The manifest maps the path of each ingested file, relative to the documents
+    directory, to its modification time, size, SHA-256 and the IDs of its chunks.
+    It also records the vector store backend, and its generation is bumped on
+    every change to the index.
+
+    :param persist_directory: The vector store directory, defaults to ``VECTOR_DB_DIR``.
+    :return: The manifest, or None if the vector store has none.
+    """
+    if persist_directory is None:
+        persist_directory = VECTOR_DB_DIR
+    try:
+        with open(_manifest_path(persist_directory)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+
+
+def save_manifest(manifest, persist_directory=None):
+    """Write the manifest atomically, so a crash never leaves half of it behind."""
+    if persist_directory is None:
+        persist_directory = VECTOR_DB_DIR
+    os.makedirs(persist_directory, exist_ok=True)
+    path = _manifest_path(persist_directory)
+    with open(f"{path}.tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    os.replace(f"{path}.tmp", path)
+
+
+def get_index_generation(persist_directory=None):
+    """The generation of the vector store, which changes whenever documents are added, changed or removed."""
+    manifest = load_manifest(persist_directory)
+    return manifest["generation"] if manifest else 0
+
+
+def _file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _chunk_ids(relative_path, file_hash, count, start=0):
+    """Stable chunk IDs, so re-adding the chunks of a file replaces them instead of duplicating them."""
+    prefix = hashlib.sha256(f"{relative_path}\0{file_hash}".encode("utf-8")).hexdigest()[:24]
+    return [f"{prefix}-{i}" for i in range(start, start + count)]
+
+
+def _batches(file_chunks, batch_size):
+    """
+    Regroup the chunks of files into batches of ``batch_size``.
+
+    :param file_chunks: An iterator over ``(file, chunks, chunk_ids, finished,
+        error)`` pieces of files, as streamed by ``stream_files``.  The pieces of
+        different files may interleave.
+    :return: An iterator over ``(chunks, chunk_ids, finished_files)``, where
+        ``finished_files`` are the ``(file, error)`` of the files whose last piece
+        came with this batch or an earlier one.
+    """
+    chunks, chunk_ids, finished = [], [], []
+    for file, file_chunks, file_chunk_ids, file_finished, error in file_chunks:
+        for chunk, chunk_id in zip(file_chunks, file_chunk_ids):
+            chunks.append(chunk)
+            chunk_ids.append(chunk_id)
+            if len(chunks) == batch_size:
+                yield chunks, chunk_ids, finished
+                chunks, chunk_ids, finished = [], [], []
+        if file_finished:
+            finished.append((file, error))
+    if chunks or finished:
+        yield chunks, chunk_ids, finished
+
+
+def _embed_and_upsert(batches, embeddings, vector_store, lexical_index, on_finished,
+                      queue_depth=INGEST_QUEUE_DEPTH):
+    """
+    Embed batches on a background thread while the previous ones are written.
+
+    The embedder computes each batch through the embedding cache and hands the
+    vectors over a bounded queue, so it pauses when the vector store falls
+    behind.  Only ``queue_depth`` batches are held at any time.
+
+    :param batches: The batches from ``_batches``.
+    :param embeddings: The cached embeddings of the vector store.
+    :param vector_store: The vector store to add the chunks to.
+    :param lexical_index: The keyword index to add the chunks to.
+    :param on_finished: Called with each file and the error that stopped it, or
+        None, once all of its chunks were added.
+    """
+    embedded = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                embedded.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def embed():
+        try:
+            for chunks, chunk_ids, finished in batches:
+                if stop.is_set():
+                    return
+                vectors = embeddings.embed_documents([chunk.page_content for chunk in chunks]) if chunks else []
+                put((chunks, chunk_ids, vectors, finished))
+        except Exception as e:
+            put(e)
+            return
+        put(None)
+
+    embedder = threading.Thread(target=embed, name="ingest-embedder", daemon=True)
+    embedder.start()
+    try:
+        while True:
+            item = embedded.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            chunks, chunk_ids, vectors, finished = item
+            if chunks:
+                # The vectors are passed along, so the store does not embed the chunks again
+                add_embedded_documents(vector_store, chunks, vectors, chunk_ids)
+                lexical_index.add(chunk_ids, chunks)
+            for file, error in finished:
+                on_finished(file, error)
+    finally:
+        stop.set()
+        embedder.join()
+
+
+def sync_vector_store(docs_directory, persist_directory=None, workers=None,
+                      batch_size=INGEST_BATCH_SIZE):
+    """
+    Bring the vector store up to date with the documents directory.
+
+    The keyword index of the chunks is kept in step with the vector store.
+    Files that are new are chunked and added, files whose content changed have
+    their old chunks replaced, and the chunks of files that were removed are
+    deleted.  Files whose modification time and size did not change are not read
+    at all, so the work done is proportional to the change, not to the corpus.
+    Changed files are parsed and split in parallel worker processes, and their
+    chunks stream back in batches, through batched embedding and batched writes
+    to the vector store, so memory stays bounded however large the corpus or any
+    one file is.  The manifest is
+    saved after each file, so an interrupted sync resumes where it stopped.
+
+    :param docs_directory: The directory of the PDFs and text files to index.
+    :param persist_directory: The vector store directory, defaults to ``VECTOR_DB_DIR``.
+    :param workers: The number of worker processes, defaults to ``INGEST_WORKERS``.
+    :param batch_size: The number of chunks embedded and written to the vector store at a time.
+    :return: The number of files added, updated, removed and left unchanged.
+    """
+    if persist_directory is None:
+        persist_directory = VECTOR_DB_DIR
+    vector_store = load_vector_store(persist_directory)
+    lexical_index = LexicalIndex(persist_directory)
+
+    manifest = load_manifest(persist_directory)
+    rebuild = (manifest is None or manifest.get("backend", "chroma") != VECTOR_BACKEND
+               or (any(entry["chunk_ids"] for entry in manifest["files"].values())
+                   and len(lexical_index) == 0))
+    if rebuild:
+        # An index built before the manifest existed has no chunk IDs to track,
+        # one built for another backend is not in this store, and one built
+        # before the keyword index existed has no keyword index, so it is
+        # cleared and rebuilt once
+        existing_ids = list_vector_store_ids(vector_store)
+        if existing_ids:
+            print(f"Clearing {len(existing_ids)} untracked chunks from the vector store")
+            vector_store.delete(ids=existing_ids)
+        lexical_index.clear()
+        manifest = {"backend": VECTOR_BACKEND,
+                    "generation": manifest["generation"] + 1 if manifest else 0,
+                    "files": {}}
+    files = manifest["files"]
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+    def commit(relative_path, entry):
+        if entry is None:
+            files.pop(relative_path, None)
+        else:
+            files[relative_path] = entry
+        manifest["generation"] += 1
+        save_manifest(manifest, persist_directory)
+
+    # Find the files whose content changed, without reading the unchanged ones
+    seen = set()
+    changed = {}
+    for file_path in sorted(list_document_files(docs_directory)):
+        relative_path = os.path.relpath(file_path, docs_directory)
+        seen.add(relative_path)
+        stat = os.stat(file_path)
+        entry = files.get(relative_path)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            stats["unchanged"] += 1
+            continue
+
+        file_hash = _file_hash(file_path)
+        if entry and entry["sha256"] == file_hash:
+            # Touched but not changed
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)
+            save_manifest(manifest, persist_directory)
+            stats["unchanged"] += 1
+            continue
+        changed[file_path] = (relative_path, stat, file_hash)
+
+    def file_chunks():
+        # The state of each file being indexed, including the IDs of its chunks so far
+        indexing = {}
+        for file_path, chunks, finished, error in stream_files(changed, iter_file_chunks, workers,
+                                                               piece_size=batch_size):
+            file = indexing.get(file_path)
+            if file is None:
+                relative_path, stat, file_hash = changed[file_path]
+                file = indexing[file_path] = {"relative_path": relative_path, "stat": stat,
+                                              "file_hash": file_hash, "chunk_ids": []}
+            chunk_ids = _chunk_ids(file["relative_path"], file["file_hash"], len(chunks),
+                                   start=len(file["chunk_ids"]))
+            file["chunk_ids"].extend(chunk_ids)
+            if finished:
+                del indexing[file_path]
+            yield file, chunks, chunk_ids, finished, error
+
+    def finish_file(file, error):
+        relative_path, stat, file_hash, chunk_ids = (file["relative_path"], file["stat"],
+                                                     file["file_hash"], file["chunk_ids"])
+        if error is not None:
+            print(f"Error loading file {relative_path}")
+            print(f"  Error details: {error}")
+            # Drop the chunks added before the error, the old ones are kept
+            if chunk_ids:
+                vector_store.delete(ids=chunk_ids)
+                lexical_index.delete(chunk_ids)
+            return
+        entry = files.get(relative_path)
+        # The new chunks have new IDs, so the old ones are only dropped now
+        if entry and entry["chunk_ids"]:
+            vector_store.delete(ids=entry["chunk_ids"])
+            lexical_index.delete(entry["chunk_ids"])
+        commit(relative_path, {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": file_hash,
+            "chunk_ids": chunk_ids
+        })
+        stats["updated" if entry else "added"] += 1
+        print(f"{'Re-indexed' if entry else 'Indexed'} {relative_path}: {len(chunk_ids)} chunks")
+
+    if changed:
+        _embed_and_upsert(_batches(file_chunks(), batch_size), get_embeddings(),
+                          vector_store, lexical_index, finish_file)
+
+    for relative_path in [path for path in files if path not in seen]:
+        chunk_ids = files[relative_path]["chunk_ids"]
+        if chunk_ids:
+            vector_store.delete(ids=chunk_ids)
+            lexical_index.delete(chunk_ids)
+        commit(relative_path, None)
+        stats["removed"] += 1
+        print(f"Removed {relative_path} from the index")
+
+    if hasattr(vector_store, "flush"):
+        vector_store.flush()
+    if rebuild:
+        save_manifest(manifest, persist_directory)
+    print(f"Vector store synced: {stats['added']} added, {stats['updated']} updated, "
+          f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+    return stats
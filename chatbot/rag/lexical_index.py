@@ -0,0 +1,136 @@
+"""BM25 keyword index of the document chunks, kept next to the vector store."""
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from chatbot.config import VECTOR_DB_DIR
+
+_LEXICAL_FILE = "lexical.db"
+
+_WORD = re.compile(r"\w+")
+
+
+def _quote(term: str) -> str:
+    """Quote a term so FTS5 matches it literally instead of parsing it as syntax."""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def code_terms(query: str) -> List[str]:
+    """
+    The product-code-like terms of a query: words with digits, like "T4" or
+    "5000", and acronyms in capitals, like "TFSA" or "RRSP".
+    """
+    return [word for word in _WORD.findall(query)
+            if any(c.isdigit() for c in word) or (len(word) > 1 and word.isupper())]
+
+
+class LexicalIndex:
+    """
+    SQLite FTS5 index of the chunk texts, searched with BM25.
+
+    It finds chunks by the exact words they contain, such as product codes and
+    fee names that embeddings tend to blur, and complements the vector store.
+    """
+
+    def __init__(self, persist_directory: str = None):
+        """
+        :param persist_directory: The vector store directory, defaults to ``VECTOR_DB_DIR``.
+        """
+        if persist_directory is None:
+            persist_directory = VECTOR_DB_DIR
+        os.makedirs(persist_directory, exist_ok=True)
+        self._con = sqlite3.connect(os.path.join(persist_directory, _LEXICAL_FILE),
+                                    check_same_thread=False)
+        self._con.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS Chunks USING fts5("
+            "ChunkId UNINDEXED, Text, Metadata UNINDEXED, tokenize='unicode61')"
+        )
+        # The number of chunks each term appears in
+        self._con.execute("CREATE VIRTUAL TABLE IF NOT EXISTS ChunkTerms USING fts5vocab(Chunks, row)")
+        self._con.commit()
+        self._lock = threading.Lock()
+        self._count: Optional[int] = None
+
+    def __len__(self):
+        with self._lock:
+            if self._count is None:
+                self._count = self._con.execute("SELECT COUNT(*) FROM Chunks").fetchone()[0]
+            return self._count
+
+    def add(self, chunk_ids: List[str], documents: List[Document]):
+        """Index chunks, replacing the ones that already have the same IDs."""
+        with self._lock:
+            self._con.executemany("DELETE FROM Chunks WHERE ChunkId = ?",
+                                  [(chunk_id,) for chunk_id in chunk_ids])
+            self._con.executemany(
+                "INSERT INTO Chunks (ChunkId, Text, Metadata) VALUES (?, ?, ?)",
+                [(chunk_id, document.page_content, json.dumps(document.metadata))
+                 for chunk_id, document in zip(chunk_ids, documents)]
+            )
+            self._con.commit()
+            self._count = None
+
+    def delete(self, chunk_ids: List[str]):
+        """Drop chunks from the index."""
+        with self._lock:
+            self._con.executemany("DELETE FROM Chunks WHERE ChunkId = ?",
+                                  [(chunk_id,) for chunk_id in chunk_ids])
+            self._con.commit()
+            self._count = None
+
+    def clear(self):
+        """Drop all chunks from the index."""
+        with self._lock:
+            self._con.execute("DELETE FROM Chunks")
+            self._con.commit()
+            self._count = 0
+
+    def document_frequencies(self, terms: List[str]) -> Dict[str, int]:
+        """
+        Count the chunks each term appears in.
+
+        :return: The number of chunks of each term, which is 0 for terms in no chunk.
+        """
+        with self._lock:
+            counts = dict(self._con.execute(
+                f"SELECT term, doc FROM ChunkTerms WHERE term IN ({','.join('?' * len(terms))})",
+                [term.lower() for term in terms]
+            ).fetchall())
+        return {term: counts.get(term.lower(), 0) for term in terms}
+
+    def _search(self, match: str, k: int) -> List[Tuple[Document, float]]:
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT Text, Metadata, bm25(Chunks) AS Rank FROM Chunks "
+                "WHERE Chunks MATCH ? ORDER BY Rank LIMIT ?",
+                (match, k)
+            ).fetchall()
+        # bm25() is lower for better matches
+        return [(Document(page_content=text, metadata=json.loads(metadata)), -rank)
+                for text, metadata, rank in rows]
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        Find the chunks that best match any of the words of a query.
+
+        :return: The chunks and their BM25 scores, best first.
+        """
+        words = _WORD.findall(query)
+        if not words:
+            return []
+        return self._search(" OR ".join(_quote(word) for word in words), k)
+
+    def search_all(self, terms: List[str], k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        Find the chunks that contain all of the terms.
+
+        :return: The chunks and their BM25 scores, best first.
+        """
+        if not terms:
+            return []
+        return self._search(" AND ".join(_quote(term) for term in terms), k)
@@ -0,0 +1,324 @@
+"""Vector store that keeps normalized embeddings in a memory-mapped float32 matrix."""
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+from chatbot.config import VECTOR_ANN, VECTOR_ANN_MIN_SIZE
+
+_VECTORS_FILE = "vectors.f32"
+_CHUNKS_FILE = "chunks.db"
+_ANN_FILE = "ann.hnsw"
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector store backed by a memory-mapped matrix of embeddings.
+
+    Each chunk is a row of unit-length float32 vectors in ``vectors.f32``, and its
+    ID, text and metadata are kept in ``chunks.db``, so loading the store only
+    maps the file instead of reading it.  Top-k is one matrix-vector product over
+    all rows.  Deleted chunks are tombstoned and their rows are reclaimed by
+    ``compact``.  With ``use_ann`` and hnswlib installed, stores of at least
+    ``ann_min_size`` chunks are searched through an HNSW graph instead.
+    """
+
+    def __init__(self, persist_directory: str, embedding_function: Embeddings,
+                 use_ann: bool = VECTOR_ANN, ann_min_size: int = VECTOR_ANN_MIN_SIZE):
+        """
+        :param persist_directory: The directory of the store files.
+        :param embedding_function: The embeddings of the texts and queries.
+        :param use_ann: Search large stores through an approximate HNSW index.
+        :param ann_min_size: The number of chunks from which the HNSW index is used.
+        """
+        os.makedirs(persist_directory, exist_ok=True)
+        self.persist_directory = persist_directory
+        self._embeddings = embedding_function
+        self.use_ann = use_ann and hnswlib is not None
+        self.ann_min_size = ann_min_size
+        self._lock = threading.RLock()
+
+        self._con = sqlite3.connect(os.path.join(persist_directory, _CHUNKS_FILE),
+                                    check_same_thread=False)
+        self._con.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS Chunks (
+              Row       INTEGER NOT NULL PRIMARY KEY,
+              ChunkId   TEXT    NOT NULL,
+              Text      TEXT    NOT NULL,
+              Metadata  TEXT    NOT NULL,
+              Deleted   INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS IX_Chunks_ChunkId ON Chunks (ChunkId);
+            CREATE TABLE IF NOT EXISTS Settings (
+              Name   TEXT NOT NULL PRIMARY KEY,
+              Value  TEXT NOT NULL
+            );
+            """
+        )
+        settings = dict(self._con.execute("SELECT Name, Value FROM Settings").fetchall())
+        self._dim: Optional[int] = int(settings["dim"]) if "dim" in settings else None
+        self._ann_rows = int(settings.get("ann_rows", 0))
+
+        rows = self._con.execute("SELECT Row, ChunkId, Deleted FROM Chunks ORDER BY Row").fetchall()
+        self._count = len(rows)
+        self._rows = {chunk_id: row for row, chunk_id, deleted in rows if not deleted}
+        self._matrix = None
+        self._deleted = np.zeros(0, dtype=bool)
+        if self._dim is not None:
+            self._map(max(self._count, 1))
+            self._deleted[:self._count] = [bool(deleted) for _, _, deleted in rows]
+        self._ann = None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.persist_directory, _VECTORS_FILE)
+
+    def _map(self, needed: int):
+        """Map the matrix file, growing it to hold at least ``needed`` rows."""
+        row_bytes = self._dim * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        capacity = size // row_bytes
+        if capacity < needed:
+            capacity = max(needed, capacity * 2, 1024)
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        if self._matrix is None or self._matrix.shape[0] != capacity:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                     shape=(capacity, self._dim))
+            deleted = np.zeros(capacity, dtype=bool)
+            deleted[:len(self._deleted)] = self._deleted[:capacity]
+            self._deleted = deleted
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    @property
+    def _live_count(self) -> int:
+        return len(self._rows)
+
+    def all_ids(self) -> List[str]:
+        """The IDs of all chunks in the store."""
+        with self._lock:
+            return list(self._rows)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  *, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Embed and add texts, replacing the chunks that already have the same IDs."""
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(texts, self._embeddings.embed_documents(texts), metadatas, ids=ids)
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]],
+                       metadatas: Optional[List[dict]] = None, *,
+                       ids: Optional[List[str]] = None) -> List[str]:
+        """Add texts whose embeddings are already computed, replacing the chunks that already have the same IDs."""
+        if not texts:
+            return []
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if ids is None:
+            ids = [os.urandom(16).hex() for _ in texts]
+        elif len(set(ids)) < len(ids):
+            # Only the last chunk of a repeated ID is kept, as if added one at a time
+            last = {chunk_id: i for i, chunk_id in enumerate(ids)}
+            keep = sorted(last.values())
+            texts = [texts[i] for i in keep]
+            embeddings = [embeddings[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            ids = [ids[i] for i in keep]
+        vectors = self._normalize(embeddings)
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._con.execute("INSERT OR REPLACE INTO Settings (Name, Value) VALUES ('dim', ?)",
+                                  (str(self._dim),))
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embeddings have {vectors.shape[1]} dimensions, the store has {self._dim}.")
+            self.delete([chunk_id for chunk_id in ids if chunk_id in self._rows])
+
+            start = self._count
+            self._map(start + len(texts))
+            self._matrix[start:start + len(texts)] = vectors
+            self._con.executemany(
+                "INSERT INTO Chunks (Row, ChunkId, Text, Metadata) VALUES (?, ?, ?, ?)",
+                [(start + i, chunk_id, text, json.dumps(metadata))
+                 for i, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))]
+            )
+            self._con.commit()
+            self._count += len(texts)
+            for i, chunk_id in enumerate(ids):
+                self._rows[chunk_id] = start + i
+            if self._ann is not None:
+                self._ann_add(start, self._count)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Tombstone the chunks with the given IDs."""
+        if not ids:
+            return True
+        with self._lock:
+            rows = [self._rows.pop(chunk_id) for chunk_id in ids if chunk_id in self._rows]
+            if not rows:
+                return True
+            self._con.executemany("UPDATE Chunks SET Deleted = 1 WHERE Row = ?",
+                                  [(row,) for row in rows])
+            self._con.commit()
+            self._deleted[rows] = True
+            if self._ann is not None:
+                for row in rows:
+                    self._ann.mark_deleted(row)
+        return True
+
+    def _ann_add(self, start: int, end: int):
+        if end > self._ann.get_max_elements():
+            self._ann.resize_index(max(end, self._ann.get_max_elements() * 2))
+        live = [row for row in range(start, end) if not self._deleted[row]]
+        if live:
+            self._ann.add_items(np.asarray(self._matrix[live]), live)
+
+    def _ensure_ann(self):
+        """Load or build the HNSW index once the store is large enough."""
+        if self._ann is not None or not self.use_ann or self._live_count < self.ann_min_size:
+            return
+        ann = hnswlib.Index(space="ip", dim=self._dim)
+        ann_path = os.path.join(self.persist_directory, _ANN_FILE)
+        if os.path.exists(ann_path) and 0 < self._ann_rows <= self._count:
+            ann.load_index(ann_path, max_elements=max(self._count, 1))
+            covered = self._ann_rows
+            # Chunks deleted since the index was saved
+            for row in np.flatnonzero(self._deleted[:covered]):
+                try:
+                    ann.mark_deleted(int(row))
+                except RuntimeError:
+                    pass
+        else:
+            ann.init_index(max_elements=max(self._count, 1), ef_construction=200, M=16)
+            covered = 0
+        self._ann = ann
+        self._ann_add(covered, self._count)
+
+    def flush(self):
+        """Write the matrix and the HNSW index to disk, compacting the store first if it is mostly tombstones."""
+        with self._lock:
+            if self._count and self._count - self._live_count > self._count // 2:
+                self.compact()
+            if self._matrix is not None:
+                self._matrix.flush()
+            # Build the index at ingestion time rather than on the first query
+            if self._dim is not None:
+                self._ensure_ann()
+            if self._ann is not None:
+                self._ann.save_index(os.path.join(self.persist_directory, _ANN_FILE))
+                self._ann_rows = self._count
+                self._con.execute("INSERT OR REPLACE INTO Settings (Name, Value) VALUES ('ann_rows', ?)",
+                                  (str(self._count),))
+                self._con.commit()
+
+    def compact(self):
+        """Drop the rows of deleted chunks and renumber the remaining ones."""
+        with self._lock:
+            live = np.flatnonzero(~self._deleted[:self._count])
+            vectors = np.array(self._matrix[live]) if len(live) else None
+            chunks = self._con.execute(
+                "SELECT ChunkId, Text, Metadata FROM Chunks WHERE Deleted = 0 ORDER BY Row"
+            ).fetchall()
+            self._con.execute("DELETE FROM Chunks")
+            self._con.executemany(
+                "INSERT INTO Chunks (Row, ChunkId, Text, Metadata) VALUES (?, ?, ?, ?)",
+                [(row, *chunk) for row, chunk in enumerate(chunks)]
+            )
+            self._con.execute("DELETE FROM Settings WHERE Name = 'ann_rows'")
+            self._con.commit()
+            if vectors is not None:
+                self._matrix[:len(live)] = vectors
+            self._deleted[:] = False
+            self._count = len(chunks)
+            self._rows = {chunk[0]: row for row, chunk in enumerate(chunks)}
+            self._ann = None
+            self._ann_rows = 0
+            ann_path = os.path.join(self.persist_directory, _ANN_FILE)
+            if os.path.exists(ann_path):
+                os.remove(ann_path)
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float],
+                                               k: int = 4) -> List[Tuple[Document, float]]:
+        """Find the chunks most similar to an embedding, with their cosine similarity."""
+        query = self._normalize(embedding)
+        with self._lock:
+            k = min(k, self._live_count)
+            if k <= 0:
+                return []
+            self._ensure_ann()
+            if self._ann is not None:
+                self._ann.set_ef(max(k * 4, 64))
+                labels, distances = self._ann.knn_query(query, k=k)
+                rows = [int(row) for row in labels[0]]
+                scores = [1 - float(distance) for distance in distances[0]]
+            else:
+                similarities = self._matrix[:self._count] @ query
+                similarities[self._deleted[:self._count]] = -np.inf
+                top = np.argpartition(-similarities, k - 1)[:k]
+                top = top[np.argsort(-similarities[top])]
+                rows = [int(row) for row in top]
+                scores = [float(similarities[row]) for row in top]
+
+            placeholders = ",".join("?" * len(rows))
+            chunks = {
+                row: (text, metadata)
+                for row, text, metadata in self._con.execute(
+                    f"SELECT Row, Text, Metadata FROM Chunks WHERE Row IN ({placeholders})", rows
+                )
+            }
+        return [
+            (Document(page_content=chunks[row][0], metadata=json.loads(chunks[row][1])), score)
+            for row, score in zip(rows, scores)
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embeddings.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities already
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings,
+                   metadatas: Optional[List[dict]] = None, *,
+                   ids: Optional[List[str]] = None, persist_directory: str = None,
+                   **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(persist_directory=persist_directory, embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        store.flush()
+        return store
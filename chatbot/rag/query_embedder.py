@@ -0,0 +1,163 @@
+"""Embeds the queries of concurrent callers together, behind an in-memory cache."""
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from chatbot.config import EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_BATCH_MAX, EMBEDDING_QUERY_CACHE_SIZE
+from chatbot.rag.embedding_cache import CachedEmbeddings
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Embeddings whose queries are coalesced into batches by one background thread.
+
+    Recent query vectors are kept in a small LRU, so a repeated question costs
+    neither a cache file read nor a model call.  Other queries are queued; the
+    embedder thread takes whatever has queued up within a short window and embeds
+    it with a single call through the on-disk cache, so concurrent questions share
+    one round trip to the model.  Callers asking for the same text while it is
+    being embedded wait for the same result.  Documents are passed straight to the
+    on-disk cache, which already embeds them in batches.
+    """
+
+    def __init__(self, embeddings: CachedEmbeddings, batch_window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+                 max_batch_size: int = EMBEDDING_BATCH_MAX, cache_size: int = EMBEDDING_QUERY_CACHE_SIZE):
+        """
+        :param embeddings: The cached embeddings that compute the vectors.
+        :param batch_window_ms: How long to gather more queries after the first one
+            arrives before embedding them.
+        :param max_batch_size: The maximum number of queries embedded together.
+        :param cache_size: The number of query vectors kept in memory.
+        """
+        self.embeddings = embeddings
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._pending: dict[str, Future] = {}
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.requests = 0
+        self.memory_hits = 0
+        self.batches = 0
+        self.batched_queries = 0
+
+    def start(self):
+        """Start the embedder thread if it is not running yet."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The query embedder is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="query-embedder",
+                                                daemon=True)
+                self._thread.start()
+
+    def close(self):
+        """Embed the queries already queued, stop the embedder thread and close the cache file."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+        self.embeddings.close()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed document chunks through the on-disk cache."""
+        return self.embeddings.embed_documents(texts)
+
+    def submit(self, text: str) -> "Future[List[float]]":
+        """
+        Queue a query, unless it is cached or already queued.
+
+        :return: A future resolved with the vector of the query.
+        """
+        with self._lock:
+            self.requests += 1
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.memory_hits += 1
+                future = Future()
+                future.set_result(vector)
+                return future
+            future = self._pending.get(text)
+            if future is not None:
+                return future
+            future = self._pending[text] = Future()
+        self.start()
+        self._queue.put(text)
+        return future
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, together with the queries of other callers arriving at the same time."""
+        return list(self.submit(text).result())
+
+    def _next_batch(self) -> tuple[List[str], bool]:
+        """
+        Wait for a query, then gather the ones that arrive shortly after it.
+
+        :return: The gathered queries and whether the embedder was asked to stop.
+        """
+        text = self._queue.get()
+        if text is None:
+            return [], True
+        batch = [text]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            try:
+                text = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if text is None:
+                return batch, True
+            batch.append(text)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if not batch:
+                continue
+            try:
+                vectors = self.embeddings.embed_queries(batch)
+            except Exception as e:
+                vectors = [e] * len(batch)
+            with self._lock:
+                self.batches += 1
+                self.batched_queries += len(batch)
+                futures = [self._pending.pop(text) for text in batch]
+                for text, vector in zip(batch, vectors):
+                    if isinstance(vector, Exception):
+                        continue
+                    self._cache[text] = vector
+                    self._cache.move_to_end(text)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for future, vector in zip(futures, vectors):
+                if isinstance(vector, Exception):
+                    future.set_exception(vector)
+                else:
+                    future.set_result(vector)
+
+    def stats(self):
+        """Counters of the query embeddings served from memory and computed in batches."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "memory_hits": self.memory_hits,
+                "cached": len(self._cache),
+                "batches": self.batches,
+                "batched_queries": self.batched_queries,
+                "average_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0,
+                "disk_hits": self.embeddings.hits,
+                "disk_misses": self.embeddings.misses
+            }
@@ -1,23 +1,176 @@
+import asyncio
 import os
+import re
 import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
 from dotenv import load_dotenv
 import google.generativeai as genai
-from langchain.chains import RetrievalQA
+from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 # Handle imports whether called directly or from MCP
 try:
-    from chatbot.rag.vector_store import load_vector_store, create_vector_store
-    from chatbot.rag.document_loader import load_documents, split_documents
+    from chatbot.rag.vector_store import load_vector_store, create_vector_store, get_embeddings
+    from chatbot.rag.ingest import sync_vector_store, get_index_generation, MANIFEST_FILE
+    from chatbot.rag.lexical_index import LexicalIndex, code_terms
+    from chatbot.rag.hybrid_retriever import HybridRetriever
+    from chatbot.rag.context_builder import build_context
 except ImportError:
-    from vector_store import load_vector_store, create_vector_store
-    from document_loader import load_documents, split_documents
+    from vector_store import load_vector_store, create_vector_store, get_embeddings
+    from ingest import sync_vector_store, get_index_generation, MANIFEST_FILE
+    from lexical_index import LexicalIndex, code_terms
+    from hybrid_retriever import HybridRetriever
+    from context_builder import build_context
+from chatbot.config import RAG_CACHE_SIZE, RAG_CACHE_TTL, RAG_CACHE_SIMILARITY, RAG_MAX_CONCURRENCY
 
 load_dotenv()
 
 # Configure the Gemini API
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
+class AnswerCache:
+    """
+    LRU cache of answers, matched on the normalized question or on a similar one.
+
+    A question is first looked up by its normalized text, and then by the cosine
+    similarity of its embedding to the cached questions.  A similar question only
+    counts if it names the same product codes, so "TFSA limit" is never answered
+    with the cached answer to "RRSP limit".  Entries expire after a TTL, and the
+    whole cache is dropped when the document index changes.
+    """
+    
+    def __init__(self, max_size=RAG_CACHE_SIZE, ttl=RAG_CACHE_TTL,
+                 similarity_threshold=RAG_CACHE_SIMILARITY):
+        """
+        :param max_size: The maximum number of cached answers.
+        :param ttl: Seconds an answer is served from the cache.
+        :param similarity_threshold: The cosine similarity above which a cached
+            question counts as the same question.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # Normalized question -> (expiry time, matrix row, product codes, answer)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # The unit embeddings of the cached questions, one row each, the question
+        # of each row and which rows are in use
+        self._matrix = None
+        self._row_keys: list = [None] * max_size
+        self._used = np.zeros(max_size, dtype=bool)
+        self._free_rows = list(range(max_size - 1, -1, -1))
+        self._generation = None
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def normalize(question):
+        """Lower-case the question, collapse its whitespace and drop trailing punctuation"""
+        return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+    
+    @staticmethod
+    def _codes(question):
+        return frozenset(term.upper() for term in code_terms(question))
+    
+    def _clear(self):
+        self._entries.clear()
+        self._matrix = None
+        self._row_keys = [None] * self.max_size
+        self._used[:] = False
+        self._free_rows = list(range(self.max_size - 1, -1, -1))
+    
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            self._clear()
+            self._generation = generation
+    
+    def _remove(self, key):
+        row = self._entries.pop(key)[1]
+        self._row_keys[row] = None
+        self._used[row] = False
+        self._free_rows.append(row)
+    
+    def get_exact(self, question, generation) -> Optional[dict]:
+        """Get the answer of a question asked before with the same normalized text"""
+        key = self.normalize(question)
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[3]
+    
+    def get_similar(self, question, embedding, generation) -> Optional[dict]:
+        """
+        Get the answer of the most similar cached question with the same product
+        codes, counting a miss if none is close enough or the question has no embedding
+        """
+        with self._lock:
+            self._check_generation(generation)
+            if embedding is not None and self._entries and self._matrix.shape[1] == len(embedding):
+                similarities = self._matrix @ embedding
+                # Free rows hold stale vectors
+                similarities[~self._used] = -np.inf
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    key = self._row_keys[best]
+                    entry = self._entries[key]
+                    if entry[0] >= time.monotonic() and entry[2] == self._codes(question):
+                        self._entries.move_to_end(key)
+                        self.similar_hits += 1
+                        return entry[3]
+            self.misses += 1
+            return None
+    
+    def put(self, question, embedding, answer, generation):
+        """Cache the answer of a question, evicting the least recently used answer if full"""
+        key = self.normalize(question)
+        with self._lock:
+            self._check_generation(generation)
+            if self._matrix is None or self._matrix.shape[1] != len(embedding):
+                self._clear()
+                self._matrix = np.zeros((self.max_size, len(embedding)), dtype=np.float32)
+            if key in self._entries:
+                self._remove(key)
+            elif not self._free_rows:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            # The vector is written into its row, the rest of the matrix is untouched
+            row = self._free_rows.pop()
+            self._matrix[row] = embedding
+            self._row_keys[row] = key
+            self._used[row] = True
+            self._entries[key] = (time.monotonic() + self.ttl, row, self._codes(question), answer)
+    
+    def clear(self):
+        """Drop all cached answers"""
+        with self._lock:
+            self._clear()
+    
+    def stats(self):
+        """The hit and miss counts of the cache"""
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.exact_hits + self.similar_hits) / lookups if lookups else 0.0
+            }
+
 class RBCChatbot:
     _instance = None
     
@@ -39,98 +192,204 @@ class RBCChatbot:
             return
             
         # Initialize the vector store
+        self.persist_directory = persist_directory
         self._ensure_vector_store_exists(persist_directory)
         self.vector_store = load_vector_store(persist_directory)
+        # Keyword and vector search, so product codes and fee names are found too
+        self.retriever = HybridRetriever(vector_store=self.vector_store,
+                                         lexical_index=LexicalIndex(persist_directory))
         
         # Initialize the LLM with explicit API key
         api_key = os.getenv("GEMINI_API_KEY")
         self.llm = ChatGoogleGenerativeAI(model="gemini-1.5-pro", temperature=0.2, google_api_key=api_key)
         
-        # Create the retrieval chain
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            chain_type="stuff",
-            retriever=self.vector_store.as_retriever(search_kwargs={"k": 5}),
-            return_source_documents=True
-        )
+        # The system prompt, sent in the system role with the retrieved context
+        self.system_prompt = """You are an AI agent for RBC Bank. Your purpose is to provide accurate information
+about RBC's products, services, and policies based on the official documentation.
+If you're unsure or the information isn't in the provided context, acknowledge that
+and suggest the user contact RBC directly. Always be professional, helpful, and concise.
+
+IMPORTANT: You must ONLY answer questions related to banking, financial services, or RBC products.
+For any questions outside of these domains (like fitness, travel, cooking, etc.), politely decline
+to answer and explain that you can only help with banking-related topics."""
         
-        # Set a system prompt for better context
-        self.system_prompt = """
-        You are an AI agent for RBC Bank. Your purpose is to provide accurate information 
-        about RBC's products, services, and policies based on the official documentation. 
-        If you're unsure or the information isn't in the provided context, acknowledge that 
-        and suggest the user contact RBC directly. Always be professional, helpful, and concise.
+        # Answers to repeated questions are served without retrieval or generation
+        self.answer_cache = AnswerCache()
+        self._manifest_mtime = None
+        self._generation = None
         
-        IMPORTANT: You must ONLY answer questions related to banking, financial services, or RBC products.
-        For any questions outside of these domains (like fitness, travel, cooking, etc.), politely decline
-        to answer and explain that you can only help with banking-related topics.
-        """
+        # Limits the questions generated at once by the async path, and counts the ones waiting
+        self._rag_slots = asyncio.Semaphore(RAG_MAX_CONCURRENCY)
+        self._rag_waiting = 0
+        self._rag_peak_waiting = 0
+        self._rag_active = 0
+        self._rag_completed = 0
         
         self._initialized = True
     
     def _ensure_vector_store_exists(self, persist_directory):
-        """Make sure the vector store exists, create it if it doesn't"""
+        """Make sure the vector store exists and is in sync with the documents directory"""
         from chatbot.config import DOCS_DIRECTORY
         
-        if not os.path.exists(persist_directory):
-            print("Vector store not found. Creating new vector store...")
-            if os.path.exists(DOCS_DIRECTORY):
-                documents = load_documents(DOCS_DIRECTORY)
-                chunks = split_documents(documents)
-                create_vector_store(chunks, persist_directory)
-            else:
-                print(f"Warning: Documents directory {DOCS_DIRECTORY} not found.")
-                print("Creating empty vector store.")
-                # Create an empty vector store
-                create_vector_store([], persist_directory)
+        if os.path.exists(DOCS_DIRECTORY):
+            # Only new, changed and removed documents are re-indexed
+            sync_vector_store(DOCS_DIRECTORY, persist_directory)
+        elif not os.path.exists(persist_directory):
+            print(f"Warning: Documents directory {DOCS_DIRECTORY} not found.")
+            print("Creating empty vector store.")
+            # Create an empty vector store
+            create_vector_store([], persist_directory)
+    
+    def _index_generation(self):
+        """The generation of the document index, only re-read when its manifest changed"""
+        try:
+            mtime = os.stat(os.path.join(self.persist_directory, MANIFEST_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._manifest_mtime or self._generation is None:
+            self._manifest_mtime = mtime
+            self._generation = get_index_generation(self.persist_directory)
+        return self._generation
+    
+    def _embed_question(self, question):
+        """
+        The unit length embedding of a question, or None if it cannot be embedded
+
+        The question is embedded as it is, like retrieval embeds it, so retrieval
+        reuses the vector from the query embedder's memory instead of embedding
+        the question a second time.
+        """
+        try:
+            embedding = np.asarray(get_embeddings().embed_query(question), dtype=np.float32)
+        except Exception as e:
+            print(f"[RAG] Could not embed question for the answer cache: {e}")
+            return None
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else None
     
     def answer_question(self, question):
+        """Answer a question using RAG, reusing the answers to the same or similar questions"""
+        generation = self._index_generation()
+        cached = self.answer_cache.get_exact(question, generation)
+        if cached is None:
+            embedding = self._embed_question(question)
+            cached = self.answer_cache.get_similar(question, embedding, generation)
+        if cached is not None:
+            return {"answer": cached["answer"], "sources": list(cached["sources"])}
+        
+        result = self._answer_question(question)
+        if embedding is not None and not result.get("error"):
+            self.answer_cache.put(question, embedding, result, generation)
+        return {"answer": result["answer"], "sources": list(result["sources"])}
+    
+    async def aanswer_question(self, question):
+        """
+        Answer a question using RAG without blocking the event loop, reusing the
+        answers to the same or similar questions
+
+        At most ``RAG_MAX_CONCURRENCY`` questions are retrieved and generated at a
+        time; the others wait for a slot.
+        """
+        generation = self._index_generation()
+        cached = self.answer_cache.get_exact(question, generation)
+        if cached is None:
+            # Embedding may call the model, so it runs on a worker thread
+            embedding = await asyncio.to_thread(self._embed_question, question)
+            cached = self.answer_cache.get_similar(question, embedding, generation)
+        if cached is not None:
+            return {"answer": cached["answer"], "sources": list(cached["sources"])}
+        
+        result = await self._aanswer_question(question)
+        if embedding is not None and not result.get("error"):
+            self.answer_cache.put(question, embedding, result, generation)
+        return {"answer": result["answer"], "sources": list(result["sources"])}
+    
+    def _build_messages(self, question, documents):
+        """
+        The prompt for a question: the system prompt and the retrieved context,
+        deduplicated and trimmed to the token budget, in the system role, and the
+        bare question as the user message
+
+        :return: The messages and the chunks included in the context.
+        """
+        context, used = build_context(documents)
+        system = f"{self.system_prompt}\n\nContext from the RBC documentation:\n\n{context}"
+        return [SystemMessage(content=system), HumanMessage(content=question)], used
+    
+    def _answer_question(self, question):
         """Answer a question using RAG"""
         try:
-            # Enhance the system prompt to emphasize banking-only responses
-            enhanced_prompt = f"""
-            {self.system_prompt}
-            
-            IMPORTANT: You are a banking assistant for RBC. Only answer questions related to banking, 
-            financial services, or RBC products and services. If the question is not related to 
-            banking or finance, politely explain that you can only assist with banking-related topics.
-            
-            Question: {question}
-            """
-            
-            # Get the answer from the chain using invoke instead of __call__
-            result = self.qa_chain.invoke({"query": enhanced_prompt})
-            
-            # Extract the answer and sources
-            answer = result["result"]
-            source_docs = result["source_documents"]
-            
-            # Format sources for citation
-            sources = []
-            for doc in source_docs:
-                if hasattr(doc, "metadata") and "source" in doc.metadata:
-                    sources.append(doc.metadata["source"])
-            
-            # Only include sources if the answer is actually about banking
-            # If the model declined to answer, don't include sources
-            if "I can only assist with banking" in answer or "I'm sorry, I can only answer" in answer:
-                sources = []
-            
-            # Return the answer and unique sources
+            # Only the question is embedded for retrieval, not the prompt around it
+            messages, source_docs = self._build_messages(question, self.retriever.invoke(question))
+            answer = self.llm.invoke(messages).content
+            return self._format_answer(answer, source_docs)
+        except Exception as e:
             return {
-                "answer": answer,
-                "sources": list(set(sources))
+                "answer": f"I encountered an error: {str(e)}",
+                "sources": [],
+                "error": True
             }
+    
+    async def _aanswer_question(self, question):
+        """Answer a question using RAG, once one of the concurrency slots is free"""
+        self._rag_waiting += 1
+        self._rag_peak_waiting = max(self._rag_peak_waiting, self._rag_waiting)
+        try:
+            await self._rag_slots.acquire()
+        finally:
+            self._rag_waiting -= 1
+        self._rag_active += 1
+        try:
+            # Retrieval runs on a worker thread, generation on the event loop
+            documents = await self.retriever.ainvoke(question)
+            messages, source_docs = self._build_messages(question, documents)
+            answer = (await self.llm.ainvoke(messages)).content
+            return self._format_answer(answer, source_docs)
         except Exception as e:
             return {
                 "answer": f"I encountered an error: {str(e)}",
-                "sources": []
+                "sources": [],
+                "error": True
             }
+        finally:
+            self._rag_active -= 1
+            self._rag_completed += 1
+            self._rag_slots.release()
+    
+    @staticmethod
+    def _format_answer(answer, source_docs):
+        """The answer with the unique sources of the chunks it was given"""
+        # Format sources for citation
+        sources = []
+        for doc in source_docs:
+            if hasattr(doc, "metadata") and "source" in doc.metadata:
+                sources.append(doc.metadata["source"])
+        
+        # Only include sources if the answer is actually about banking
+        # If the model declined to answer, don't include sources
+        if "I can only assist with banking" in answer or "I'm sorry, I can only answer" in answer:
+            sources = []
+        
+        # Return the answer and unique sources
+        return {
+            "answer": answer,
+            "sources": list(set(sources))
+        }
+    
+    def rag_queue_stats(self):
+        """The questions being answered and waiting on the async path"""
+        return {
+            "max_concurrency": RAG_MAX_CONCURRENCY,
+            "active": self._rag_active,
+            "waiting": self._rag_waiting,
+            "peak_waiting": self._rag_peak_waiting,
+            "completed": self._rag_completed
+        }
     
     def get_relevant_documents(self, query):
         """Retrieve relevant documents for a query without generating an answer"""
         try:
-            docs = self.vector_store.similarity_search(query, k=5)
+            docs = self.retriever.invoke(query)
             sources = []
             for doc in docs:
                 if hasattr(doc, "metadata") and "source" in doc.metadata:
@@ -1,5 +1,7 @@
 import os
+from functools import lru_cache
 from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from dotenv import load_dotenv
 import google.generativeai as genai
@@ -8,24 +10,65 @@ load_dotenv()
 
 # Configure the Gemini API with the API key from .env
 api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
-genai.configure(api_key=api_key)
+if api_key:
+    genai.configure(api_key=api_key)
 
-from chatbot.config import VECTOR_DB_DIR
+from chatbot.config import VECTOR_DB_DIR, VECTOR_BACKEND, EMBEDDING_BACKEND, EMBEDDING_MODEL, EMBEDDING_FAKE_SIZE, EMBEDDING_CACHE_FILE
+from chatbot.rag.embedding_cache import CachedEmbeddings
+from chatbot.rag.query_embedder import BatchingEmbeddings
+from chatbot.rag.numpy_store import NumpyVectorStore
+
+# The vector store classes selectable with VECTOR_BACKEND
+VECTOR_STORES = {
+    "chroma": Chroma,
+    "numpy": NumpyVectorStore,
+}
+
+@lru_cache(maxsize=None)
+def get_embeddings():
+    """
+    Get the configured embeddings, backed by the on-disk embedding cache, with
+    concurrent queries embedded in batches
+    """
+    if EMBEDDING_BACKEND == "fake":
+        # Deterministic vectors derived from the text, no API calls
+        embeddings = DeterministicFakeEmbedding(size=EMBEDDING_FAKE_SIZE)
+        model = f"fake-{EMBEDDING_FAKE_SIZE}"
+        embed_queries = embeddings.embed_documents
+    elif EMBEDDING_BACKEND == "google":
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        # Initialize the embeddings using Gemini with explicit API key
+        embeddings = GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            google_api_key=api_key
+        )
+        model = EMBEDDING_MODEL
+
+        def embed_queries(texts):
+            # One request for all the queries of a batch
+            result = genai.embed_content(model=EMBEDDING_MODEL, content=texts,
+                                         task_type="retrieval_query")
+            return result["embedding"]
+    else:
+        raise ValueError(f"Unknown embedding backend {EMBEDDING_BACKEND}")
+    return BatchingEmbeddings(CachedEmbeddings(embeddings, model=model, cache_file=EMBEDDING_CACHE_FILE,
+                                               embed_queries=embed_queries))
+
+def _vector_store_class():
+    if VECTOR_BACKEND not in VECTOR_STORES:
+        raise ValueError(f"Unknown vector store backend {VECTOR_BACKEND}")
+    return VECTOR_STORES[VECTOR_BACKEND]
 
 def create_vector_store(documents, persist_directory=None):
     if persist_directory is None:
         persist_directory = VECTOR_DB_DIR
     """Create a vector store from document chunks"""
-    # Initialize the embeddings using Gemini with explicit API key
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=api_key
-    )
+    # Only chunks whose text is not in the embedding cache are sent to the model
+    embeddings = get_embeddings()
     
     # Create the vector store (persistence is automatic)
-    vector_store = Chroma.from_documents(
+    vector_store = _vector_store_class().from_documents(
         documents=documents,
         embedding=embeddings,
         persist_directory=persist_directory
@@ -38,10 +81,27 @@ def load_vector_store(persist_directory=None):
     if persist_directory is None:
         persist_directory = VECTOR_DB_DIR
     """Load an existing vector store"""
-    # Use the same API key as in create_vector_store
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=api_key
-    )
-    vector_store = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+    # Queries are embedded through the same cache as the documents
+    embeddings = get_embeddings()
+    vector_store = _vector_store_class()(persist_directory=persist_directory, embedding_function=embeddings)
     return vector_store
+
+def list_vector_store_ids(vector_store):
+    """List the IDs of all chunks in a vector store of any backend"""
+    if isinstance(vector_store, NumpyVectorStore):
+        return vector_store.all_ids()
+    return vector_store.get(include=[])["ids"]
+
+def add_embedded_documents(vector_store, documents, vectors, ids):
+    """
+    Add document chunks with embeddings that are already computed, so the vector
+    store does not embed them again
+    """
+    texts = [document.page_content for document in documents]
+    metadatas = [document.metadata for document in documents]
+    if isinstance(vector_store, NumpyVectorStore):
+        vector_store.add_embeddings(texts, vectors, metadatas, ids=ids)
+    elif isinstance(vector_store, Chroma):
+        vector_store._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+    else:
+        vector_store.add_documents(documents, ids=ids)
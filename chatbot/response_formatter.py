@@ -89,6 +89,25 @@ class ResponseFormatter:
             print(f"Error formatting transfer result: {e}")
             return "The transfer has been processed."
     
+    @staticmethod
+    def format_transfer_funds_batch(result: Any) -> str:
+        """Format the result of a batch of transfers."""
+        try:
+            if isinstance(result, dict) and "error" in result:
+                return f"❌ {result['error']}"
+            if isinstance(result, dict) and result.get("transfers"):
+                lines = ["✅ I've completed these transfers for you:"]
+                for transfer in result["transfers"]:
+                    lines.append(
+                        f"- ${transfer.get('amount', '')} from {transfer.get('from_account', '')} "
+                        f"to {transfer.get('to_account', '')}"
+                    )
+                return "\n".join(lines)
+            return "I've completed the transfers for you."
+        except Exception as e:
+            print(f"Error formatting batch transfer result: {e}")
+            return "The transfers have been processed."
+    
     @staticmethod
     def format_get_transaction_history(result: Any) -> str:
         """Format transaction history."""
@@ -96,8 +115,18 @@ class ResponseFormatter:
             # Handle both list and single transaction object formats
             transactions = []
             
+            # Pages are already as long as asked for, other results show the first 5
+            max_shown = 5
+            next_cursor = None
             if isinstance(result, list):
                 transactions = result
+            elif isinstance(result, dict) and "transactions" in result:
+                # A page of transactions
+                transactions = result["transactions"]
+                next_cursor = result.get("next_cursor")
+                max_shown = len(transactions)
+            elif isinstance(result, dict) and "error" in result:
+                return f"I'm sorry, there was an error: {result['error']}"
             elif isinstance(result, dict):
                 # Single transaction as a dict
                 transactions = [result]
@@ -114,13 +143,15 @@ class ResponseFormatter:
             
             if transactions and len(transactions) > 0:
                 lines = ["Here are the recent transactions for your account:"]
-                for i, transaction in enumerate(transactions[:5]):  # Show only first 5 transactions
+                for i, transaction in enumerate(transactions[:max_shown]):
                     date = transaction.get('date', 'Unknown date')
                     desc = transaction.get('description', 'Transaction')
                     amount = transaction.get('amount', '0.00')
                     lines.append(f"- {date}: {desc}: ${amount}")
-                if len(transactions) > 5:
-                    lines.append(f"...and {len(transactions) - 5} more transactions.")
+                if len(transactions) > max_shown:
+                    lines.append(f"...and {len(transactions) - max_shown} more transactions.")
+                if next_cursor:
+                    lines.append('Say "more" to see older transactions.')
                 return "\n".join(lines)
             else:
                 return "I couldn't find any transactions for this account."
@@ -128,6 +159,44 @@ class ResponseFormatter:
             print(f"Error formatting transaction history: {e}")
             return "I found your transaction history but couldn't format it properly."
     
+    @staticmethod
+    def format_get_balance_at_date(result: Any) -> str:
+        """Format the balance of an account at a past date."""
+        try:
+            if isinstance(result, dict) and "error" in result:
+                return f"I'm sorry, there was an error: {result['error']}"
+            if isinstance(result, dict) and "balance" in result:
+                return (f"At the end of {result.get('date', '')}, your "
+                        f"{result.get('account_name', 'account')} ({result.get('account_number', '')}) "
+                        f"had a balance of {result.get('balance', '')} {result.get('currency', 'CAD')}.")
+            return "I found the balance for that date."
+        except Exception as e:
+            print(f"Error formatting balance at date: {e}")
+            return "I found the balance for that date."
+    
+    @staticmethod
+    def format_get_account_summary(result: Any) -> str:
+        """Format the summary of an account over a period."""
+        try:
+            if isinstance(result, dict) and "error" in result:
+                return f"I'm sorry, there was an error: {result['error']}"
+            if isinstance(result, dict) and "closing_balance" in result:
+                currency = result.get('currency', 'CAD')
+                return "\n".join([
+                    f"Summary of your {result.get('account_name', 'account')} "
+                    f"({result.get('account_number', '')}) from {result.get('start_date', '')} "
+                    f"to {result.get('end_date', '')}:",
+                    f"- Opening balance: {result.get('opening_balance', '')} {currency}",
+                    f"- Money in: {result.get('total_in', '')} {currency}",
+                    f"- Money out: {result.get('total_out', '')} {currency}",
+                    f"- Closing balance: {result.get('closing_balance', '')} {currency}",
+                    f"- Transactions: {result.get('transaction_count', 0)}"
+                ])
+            return "I found the summary of your account."
+        except Exception as e:
+            print(f"Error formatting account summary: {e}")
+            return "I found the summary of your account."
+    
     @staticmethod
     def format_answer_banking_question(result: Any) -> str:
         """Format RAG answer."""
@@ -0,0 +1,127 @@
+"""Per-user pool of banking assistant sessions."""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Callable, Optional
+
+from chatbot.config import SESSION_POOL_SIZE, SESSION_IDLE_TTL
+
+
+@dataclass
+class _Session:
+    """An assistant together with the state needed to manage it in the pool."""
+
+    assistant: Any
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class SessionManager:
+    """Keeps one assistant per user, created lazily and evicted when idle.
+
+    Sessions are kept in least-recently-used order.  When the pool is full the
+    least recently used session is dropped, and sessions that have not been used
+    for longer than the idle TTL are dropped on the next access.  All methods must
+    be called from the event loop that runs the assistants.
+    """
+
+    def __init__(self, factory: Callable[[str], Any],
+                 max_sessions: int = SESSION_POOL_SIZE,
+                 idle_ttl: float = SESSION_IDLE_TTL):
+        """
+        :param factory: Called with a user ID to build a new assistant for that user.
+        :param max_sessions: The maximum number of sessions kept at the same time.
+        :param idle_ttl: Seconds a session may stay unused before it is evicted.
+        """
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _get_session(self, user_id: str) -> _Session:
+        """Return the session of the user, creating it if needed."""
+        now = time.monotonic()
+        self.evict_expired(now)
+
+        session = self._sessions.get(user_id)
+        if session is None:
+            # Sessions busy with a message are kept, so the pool grows past its size
+            # for a while if all of them are busy
+            excess = len(self._sessions) - self.max_sessions + 1
+            if excess > 0:
+                idle = list(islice((evicted_user for evicted_user, evicted in self._sessions.items()
+                                    if not evicted.lock.locked()), excess))
+                for evicted_user in idle:
+                    del self._sessions[evicted_user]
+                    print(f"[SESSION] Evicted least recently used session for {evicted_user}")
+            session = _Session(assistant=self.factory(user_id))
+            self._sessions[user_id] = session
+        else:
+            self._sessions.move_to_end(user_id)
+        session.last_used = now
+        return session
+
+    def get(self, user_id: str) -> Any:
+        """
+        Get the assistant of the user, creating one if the user has no live session.
+
+        :param user_id: The authenticated user ID.
+        :return: The assistant that serves the user.
+        """
+        return self._get_session(user_id).assistant
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """
+        Drop the sessions that have been idle for longer than the idle TTL.
+
+        :param now: The current monotonic time, defaults to ``time.monotonic()``.
+        :return: The number of evicted sessions.
+        """
+        if now is None:
+            now = time.monotonic()
+        evicted = 0
+        # Sessions are ordered by last use, so the expired ones are at the front
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.idle_ttl or session.lock.locked():
+                break
+            del self._sessions[user_id]
+            evicted += 1
+        return evicted
+
+    def remove(self, user_id: str):
+        """Drop the session of the user, if any."""
+        self._sessions.pop(user_id, None)
+
+    async def send_message(self, user_id: str, message: str):
+        """
+        Send a message to the assistant of the user.
+
+        Messages of the same user are processed one at a time so the conversation
+        history stays in order, while different users are served concurrently.
+
+        :param user_id: The authenticated user ID.
+        :param message: The message typed by the user.
+        :return: The assistant's reply.
+        """
+        session = self._get_session(user_id)
+        async with session.lock:
+            return await session.assistant.send_message(message)
+
+    async def stream_message(self, user_id: str, message: str):
+        """
+        Send a message to the assistant of the user and stream the reply.
+
+        :param user_id: The authenticated user ID.
+        :param message: The message typed by the user.
+        :return: An async iterator over the ``(kind, content)`` events of the reply.
+        """
+        session = self._get_session(user_id)
+        async with session.lock:
+            async for event in session.assistant.stream_message(message):
+                yield event
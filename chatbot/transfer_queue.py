@@ -0,0 +1,156 @@
+"""Single writer that group-commits the transfers of concurrent callers."""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Optional
+
+from chatbot.config import DB_GROUP_COMMIT_MS, DB_GROUP_COMMIT_MAX
+from chatbot.database import apply_transfer_group
+from chatbot.models import TransferResult
+
+
+@dataclass
+class _TransferRequest:
+    """The legs of one caller's transfer and the future its results are set on."""
+
+    user_id: str
+    transfers: list[tuple[str, str, Decimal]]
+    idempotency_key: Optional[str] = None
+    future: Future = field(default_factory=Future)
+
+
+class TransferWriter:
+    """
+    Applies all transfers from one thread, committing them in groups.
+
+    Callers put their transfers on a queue and wait on a future.  The writer thread
+    takes whatever has queued up while it was busy and applies it in a single
+    transaction, so concurrent transfers share one lock acquisition and one fsync
+    instead of contending for the write lock.  Each request still succeeds or
+    fails on its own.
+    """
+
+    def __init__(self, commit_interval_ms: float = DB_GROUP_COMMIT_MS,
+                 max_group_size: int = DB_GROUP_COMMIT_MAX):
+        """
+        :param commit_interval_ms: How long to keep gathering requests that arrive
+            together with others before committing them.
+        :param max_group_size: The maximum number of requests committed together.
+        """
+        self.commit_interval = commit_interval_ms / 1000
+        self.max_group_size = max_group_size
+        self._queue: "queue.Queue[Optional[_TransferRequest]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self):
+        """Start the writer thread if it is not running yet."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The transfer writer is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="transfer-writer",
+                                                daemon=True)
+                self._thread.start()
+
+    def close(self):
+        """Apply the transfers already queued and stop the writer thread."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def submit(self, user_id: str, transfers: list[tuple[str, str, Decimal]],
+               idempotency_key: Optional[str] = None) -> "Future[list[TransferResult]]":
+        """
+        Queue the transfers of one request.
+
+        :param user_id: The user ID of the account owner.
+        :param transfers: The (from_account, to_account, amount) of each leg, applied
+            in order and all or nothing.
+        :param idempotency_key: A key that makes a retried request return the
+            original results instead of being applied again.
+        :return: A future resolved with the result of each leg, or with the error
+            that made the request fail.
+        """
+        self.start()
+        request = _TransferRequest(user_id, transfers, idempotency_key)
+        self._queue.put(request)
+        return request.future
+
+    def transfer(self, user_id: str, transfers: list[tuple[str, str, Decimal]],
+                 idempotency_key: Optional[str] = None) -> list[TransferResult]:
+        """Queue the transfers of one request and wait for their results."""
+        return self.submit(user_id, transfers, idempotency_key).result()
+
+    def _next_group(self) -> tuple[list[_TransferRequest], bool]:
+        """
+        Wait for a request, then gather the ones queued with it.
+
+        Requests already queued are taken without waiting.  Only when others were
+        queued with the first one, so callers are arriving together, does the writer
+        wait for more until the commit window ends; a lone request is committed at once.
+
+        :return: The gathered requests and whether the writer was asked to stop.
+        """
+        request = self._queue.get()
+        if request is None:
+            return [], True
+        group = [request]
+        deadline = time.monotonic() + self.commit_interval
+        while len(group) < self.max_group_size:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                if len(group) == 1:
+                    break
+                try:
+                    request = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if request is None:
+                return group, True
+            group.append(request)
+        return group, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            group, stopping = self._next_group()
+            if not group:
+                continue
+            # Callers may have given up on their future while it was queued
+            group = [request for request in group if request.future.set_running_or_notify_cancel()]
+            try:
+                outcomes = apply_transfer_group(
+                    [(request.user_id, request.transfers, request.idempotency_key)
+                     for request in group]
+                )
+            except Exception as e:
+                outcomes = [e] * len(group)
+            for request, outcome in zip(group, outcomes):
+                if isinstance(outcome, Exception):
+                    request.future.set_exception(outcome)
+                else:
+                    request.future.set_result(outcome)
+            print(f"[DEBUG] Committed a group of {len(group)} transfer requests")
+
+
+_writer: Optional[TransferWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_transfer_writer() -> TransferWriter:
+    """Return the writer of the configured database, creating it on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = TransferWriter()
+    return _writer
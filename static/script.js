@@ -99,6 +99,35 @@ function appendMessage(sender, message) {
   
   chatBox.appendChild(msgElem);
   chatBox.scrollTop = chatBox.scrollHeight;
+  return msgElem;
+}
+
+// Read the server-sent events of a streamed reply, calling onEvent for each one
+async function readEventStream(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const data = rawEvent
+        .split('\n')
+        .filter(line => line.startsWith('data: '))
+        .map(line => line.slice(6))
+        .join('\n');
+      if (data) {
+        onEvent(JSON.parse(data));
+      }
+    }
+  }
 }
 
 // Handle user login submission
@@ -179,7 +208,7 @@ async function sendMessage() {
     // Show typing indicator
     showTypingIndicator();
     
-    const res = await fetch('/chat', {
+    const res = await fetch('/chat/stream', {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -188,13 +217,45 @@ async function sendMessage() {
       body: JSON.stringify({ message })
     });
     
-    const data = await res.json();
+    // Errors such as an expired login come back as a plain JSON reply
+    if (!res.ok || !res.body) {
+      const data = await res.json();
+      removeTypingIndicator();
+      appendMessage('Bot', data.reply || data.detail || '⚠️ Could not send message.');
+      return;
+    }
     
-    // Remove typing indicator after we get the response
-    removeTypingIndicator();
+    // Render the bot's reply as it streams in
+    const chatBox = document.getElementById('chat-box');
+    let msgElem = null;
+    let reply = '';
+    const render = (text) => {
+      if (!msgElem) {
+        // Remove typing indicator once the first piece of the reply arrives
+        removeTypingIndicator();
+        msgElem = appendMessage('Bot', text);
+      } else {
+        msgElem.innerHTML = parseMarkdown(text);
+        chatBox.scrollTop = chatBox.scrollHeight;
+      }
+    };
     
-    // Display the bot's response
-    appendMessage('Bot', data.reply);
+    await readEventStream(res, (event) => {
+      if (event.type === 'text') {
+        reply += event.content;
+        render(reply);
+      } else if (event.type === 'tool') {
+        reply = reply.trim() ? `${reply.trim()}\n${event.content}` : event.content;
+        render(reply);
+      } else if (event.type === 'done') {
+        // The final reply is authoritative, e.g. it replaces empty replies with a greeting
+        render(event.content);
+      } else if (event.type === 'error') {
+        removeTypingIndicator();
+        appendMessage('System', event.content);
+      }
+    });
+    removeTypingIndicator();
   } catch (err) {
     // Remove typing indicator
     removeTypingIndicator();
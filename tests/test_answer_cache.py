@@ -0,0 +1,77 @@
+"""Tests of the cache of RAG answers."""
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_chroma")
+pytest.importorskip("langchain_google_genai")
+pytest.importorskip("google.generativeai")
+
+from chatbot.rag.rag_chatbot import AnswerCache
+
+
+def _unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+ANSWER = {"answer": "The limit is $7000.", "sources": []}
+
+
+def test_normalized_question_is_an_exact_hit():
+    cache = AnswerCache(max_size=4)
+    cache.put("What is the TFSA limit?", _unit(1, 0, 0), ANSWER, generation=1)
+
+    assert cache.get_exact("  what is the  TFSA limit ", generation=1) == ANSWER
+    assert cache.get_exact("What is the RRSP limit?", generation=1) is None
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_similar_question_needs_the_same_product_codes():
+    cache = AnswerCache(max_size=4, similarity_threshold=0.9)
+    cache.put("What is the TFSA limit?", _unit(1, 0, 0), ANSWER, generation=1)
+
+    assert cache.get_similar("How much can I put in a TFSA?", _unit(1, 0.1, 0), generation=1) == ANSWER
+    assert cache.get_similar("How much can I put in an RRSP?", _unit(1, 0.1, 0), generation=1) is None
+    assert cache.get_similar("What are the fees?", _unit(0, 1, 0), generation=1) is None
+    stats = cache.stats()
+    assert (stats["similar_hits"], stats["misses"]) == (1, 2)
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = AnswerCache(max_size=2)
+    cache.put("first", _unit(1, 0, 0), {"answer": "1"}, generation=1)
+    cache.put("second", _unit(0, 1, 0), {"answer": "2"}, generation=1)
+    cache.get_exact("first", generation=1)
+    cache.put("third", _unit(0, 0, 1), {"answer": "3"}, generation=1)
+
+    assert cache.get_exact("second", generation=1) is None
+    assert cache.get_exact("first", generation=1) == {"answer": "1"}
+    # The freed row holds the new question, not the evicted one
+    assert cache.get_similar("anything", _unit(0, 0, 1), generation=1) == {"answer": "3"}
+    assert cache.get_similar("anything", _unit(0, 1, 0), generation=1) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_replacing_a_question_reuses_its_row():
+    cache = AnswerCache(max_size=1)
+    cache.put("first", _unit(1, 0, 0), {"answer": "old"}, generation=1)
+    cache.put("first", _unit(1, 0, 0), {"answer": "new"}, generation=1)
+
+    assert cache.get_exact("first", generation=1) == {"answer": "new"}
+    assert cache.stats()["evictions"] == 0
+
+
+def test_expired_answers_are_not_served():
+    cache = AnswerCache(max_size=2, ttl=-1)
+    cache.put("first", _unit(1, 0, 0), ANSWER, generation=1)
+
+    assert cache.get_exact("first", generation=1) is None
+    assert cache.get_similar("first", _unit(1, 0, 0), generation=1) is None
+
+
+def test_new_index_generation_drops_the_cache():
+    cache = AnswerCache(max_size=2)
+    cache.put("first", _unit(1, 0, 0), ANSWER, generation=1)
+
+    assert cache.get_exact("first", generation=2) is None
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,47 @@
+"""Tests of the function calls the banking assistant makes through MCP."""
+import asyncio
+import json
+
+import pytest
+
+genai = pytest.importorskip("google.generativeai")
+pytest.importorskip("mcp")
+
+from chatbot.mcp.client_sse import InteractiveBankingAssistant
+
+
+class RecordingPool:
+    """Records the tool calls instead of sending them to the MCP server."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def call_tool(self, name, args):
+        # The MCP client serializes the arguments to JSON
+        self.calls.append((name, json.loads(json.dumps(args))))
+        return {"status": "ok"}
+
+
+def test_nested_function_call_args_are_sent_as_plain_json():
+    function_call = genai.protos.FunctionCall(
+        name="transfer_funds_batch",
+        args={"transfers": [
+            {"from_account": "Chequing", "to_account": "Savings", "amount": 10},
+            {"from_account": "Savings", "to_account": "TFSA", "amount": 2.5},
+        ]},
+    )
+    pool = RecordingPool()
+    assistant = InteractiveBankingAssistant(user_id="test1", pool=pool)
+
+    result = asyncio.run(assistant._execute_function_call(function_call.name, function_call.args))
+
+    assert result == {"status": "ok"}
+    name, args = pool.calls[0]
+    assert name == "transfer_funds_batch"
+    assert args["transfers"] == [
+        {"from_account": "Chequing", "to_account": "Savings", "amount": 10},
+        {"from_account": "Savings", "to_account": "TFSA", "amount": 2.5},
+    ]
+    assert args["user_id"] == "test1"
+    assert args["idempotency_key"]
+
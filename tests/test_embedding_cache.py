@@ -0,0 +1,89 @@
+"""Tests of the on-disk embedding cache."""
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from chatbot.rag.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """Fake embeddings that record the texts sent to the model."""
+
+    def __init__(self):
+        self.fake = DeterministicFakeEmbedding(size=8)
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return self.fake.embed_documents(texts)
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return self.fake.embed_query(text)
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / "embeddings.db")
+
+
+def test_documents_are_embedded_once(cache_file):
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, model="fake", cache_file=cache_file)
+
+    first = cache.embed_documents(["fees", "limits", "fees"])
+    second = cache.embed_documents(["limits", "fees"])
+
+    assert model.embedded == ["fees", "limits"]
+    # The cache stores float32, so vectors read back differ from fresh ones in precision
+    assert first[0] == first[2]
+    assert second[1] == pytest.approx(first[0], rel=1e-6)
+    assert second[0] == pytest.approx(first[1], rel=1e-6)
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_queries_and_documents_are_cached_apart(cache_file):
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, model="fake", cache_file=cache_file)
+
+    cache.embed_documents(["fees"])
+    cache.embed_query("fees")
+    cache.embed_query("fees")
+
+    assert model.embedded == ["fees", "fees"]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_vectors_are_kept_per_model(cache_file):
+    cache = CachedEmbeddings(CountingEmbeddings(), model="fake", cache_file=cache_file)
+    cache.embed_documents(["fees"])
+    cache.close()
+
+    model = CountingEmbeddings()
+    other = CachedEmbeddings(model, model="other", cache_file=cache_file)
+    other.embed_documents(["fees"])
+    other.close()
+    assert model.embedded == ["fees"]
+
+    model = CountingEmbeddings()
+    reopened = CachedEmbeddings(model, model="fake", cache_file=cache_file)
+    reopened.embed_documents(["fees"])
+    assert model.embedded == []
+    assert (reopened.hits, reopened.misses) == (1, 0)
+
+
+def test_queries_are_embedded_in_one_call(cache_file):
+    model = CountingEmbeddings()
+    calls = []
+
+    def embed_queries(texts):
+        calls.append(list(texts))
+        return model.embed_documents(texts)
+
+    cache = CachedEmbeddings(model, model="fake", cache_file=cache_file, embed_queries=embed_queries)
+    cache.embed_queries(["a", "b"])
+    cache.embed_queries(["b", "c"])
+
+    assert calls == [["a", "b"], ["c"]]
@@ -0,0 +1,80 @@
+"""Tests of the incremental sync of the documents folder into the vector store."""
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_community")
+pytest.importorskip("langchain_chroma")
+pytest.importorskip("langchain_google_genai")
+pytest.importorskip("google.generativeai")
+
+from chatbot.rag import ingest, vector_store
+from chatbot.rag.ingest import load_manifest, sync_vector_store
+from chatbot.rag.lexical_index import LexicalIndex
+
+
+@pytest.fixture
+def fake_backend(tmp_path, monkeypatch):
+    """Fake embeddings with a cache and a numpy store in the test directory."""
+    monkeypatch.setattr(vector_store, "EMBEDDING_BACKEND", "fake")
+    monkeypatch.setattr(vector_store, "EMBEDDING_CACHE_FILE", str(tmp_path / "embeddings.db"))
+    monkeypatch.setattr(vector_store, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(ingest, "VECTOR_BACKEND", "numpy")
+    vector_store.get_embeddings.cache_clear()
+    yield
+    vector_store.get_embeddings().close()
+    vector_store.get_embeddings.cache_clear()
+
+
+@pytest.fixture
+def docs(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    return docs
+
+
+def _sync(docs, persist_directory):
+    return sync_vector_store(str(docs), str(persist_directory), workers=2, batch_size=2)
+
+
+def _indexed(persist_directory):
+    """The texts in the vector store and in the keyword index, by source file."""
+    store = vector_store.load_vector_store(str(persist_directory))
+    ids = store.all_ids()
+    manifest = load_manifest(str(persist_directory))
+    assert sorted(ids) == sorted(chunk_id for entry in manifest["files"].values()
+                                 for chunk_id in entry["chunk_ids"])
+    assert len(LexicalIndex(str(persist_directory))) == len(ids)
+    return {path: len(entry["chunk_ids"]) for path, entry in manifest["files"].items()}
+
+
+def test_sync_adds_updates_and_removes_files(tmp_path, docs, fake_backend):
+    index = tmp_path / "index"
+    (docs / "fees.txt").write_text("Chequing accounts cost $4 a month.")
+    (docs / "tfsa.txt").write_text("The TFSA limit is $7000.")
+
+    assert _sync(docs, index) == {"added": 2, "updated": 0, "removed": 0, "unchanged": 0}
+    assert _indexed(index) == {"fees.txt": 1, "tfsa.txt": 1}
+
+    (docs / "fees.txt").write_text("Chequing accounts cost $6 a month, waived over $4000.")
+    (docs / "tfsa.txt").unlink()
+    (docs / "rrsp.txt").write_text("RRSP contributions are tax deductible.")
+
+    assert _sync(docs, index) == {"added": 1, "updated": 1, "removed": 1, "unchanged": 0}
+    assert _indexed(index) == {"fees.txt": 1, "rrsp.txt": 1}
+    lexical = LexicalIndex(str(index))
+    assert [document.page_content for document, _ in lexical.search_all(["TFSA"])] == []
+    # The old chunk of the modified file is gone
+    assert [document.page_content for document, _ in lexical.search_all(["4", "month"])] == []
+    assert [document.metadata["source"] for document, _ in lexical.search_all(["4000"])] \
+        == [str(docs / "fees.txt")]
+
+
+def test_unchanged_files_are_not_embedded_again(tmp_path, docs, fake_backend):
+    index = tmp_path / "index"
+    (docs / "fees.txt").write_text("Chequing accounts cost $4 a month.")
+    _sync(docs, index)
+    cache = vector_store.get_embeddings().embeddings
+    misses = cache.misses
+
+    assert _sync(docs, index) == {"added": 0, "updated": 0, "removed": 0, "unchanged": 1}
+    assert cache.misses == misses
@@ -0,0 +1,75 @@
+"""Tests of the memory-mapped vector store."""
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from chatbot.rag.numpy_store import NumpyVectorStore
+
+TEXTS = ["chequing account fees", "savings interest rates", "TFSA contribution limit"]
+IDS = ["fees", "rates", "tfsa"]
+
+
+@pytest.fixture
+def embeddings():
+    return DeterministicFakeEmbedding(size=16)
+
+
+@pytest.fixture
+def store(tmp_path, embeddings):
+    store = NumpyVectorStore(str(tmp_path), embeddings, use_ann=False)
+    store.add_texts(TEXTS, [{"source": chunk_id} for chunk_id in IDS], ids=IDS)
+    return store
+
+
+def _top(store, text):
+    return store.similarity_search(text, k=1)[0].page_content
+
+
+def test_exact_text_is_the_best_match(store):
+    for text in TEXTS:
+        assert _top(store, text) == text
+
+
+def test_deleted_chunks_are_not_found(store):
+    store.delete(["rates"])
+
+    assert sorted(store.all_ids()) == ["fees", "tfsa"]
+    found = [document.page_content for document in store.similarity_search(TEXTS[1], k=3)]
+    assert found == [text for text in found if text != TEXTS[1]]
+    assert len(found) == 2
+
+
+def test_adding_an_existing_id_replaces_the_chunk(store):
+    store.add_texts(["RRSP deduction limit"], ids=["tfsa"])
+
+    assert sorted(store.all_ids()) == sorted(IDS)
+    assert _top(store, "RRSP deduction limit") == "RRSP deduction limit"
+    assert TEXTS[2] not in [document.page_content for document in store.similarity_search(TEXTS[2], k=3)]
+
+
+def test_compact_keeps_the_live_chunks(store):
+    store.delete(["fees"])
+    store.compact()
+
+    assert store._count == 2
+    assert sorted(store.all_ids()) == ["rates", "tfsa"]
+    assert _top(store, TEXTS[1]) == TEXTS[1]
+    assert _top(store, TEXTS[2]) == TEXTS[2]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_reload_sees_the_same_chunks(tmp_path, embeddings, store, compact):
+    store.delete(["rates"])
+    if compact:
+        store.compact()
+    store.flush()
+
+    reloaded = NumpyVectorStore(str(tmp_path), embeddings, use_ann=False)
+
+    assert sorted(reloaded.all_ids()) == ["fees", "tfsa"]
+    assert _top(reloaded, TEXTS[0]) == TEXTS[0]
+    assert _top(reloaded, TEXTS[2]) == TEXTS[2]
+    assert TEXTS[1] not in [document.page_content for document in reloaded.similarity_search(TEXTS[1], k=3)]
@@ -0,0 +1,88 @@
+"""Tests of idempotent transfers and of the group commit of transfer requests."""
+from decimal import Decimal
+
+import pytest
+
+from chatbot import database, db_pool
+from chatbot.database import apply_transfer_group, load_account, transfer_funds_batch
+
+CHEQUING = "1234567890"
+SAVING = "2345678901"
+CREDIT_CARD = "3456789012"
+
+
+@pytest.fixture(autouse=True)
+def bank(tmp_path, monkeypatch):
+    """A fresh database, with the transfers each listener is told about recorded."""
+    db_file = str(tmp_path / "bank.db")
+    monkeypatch.setattr(db_pool, "DB_FILE", db_file)
+    monkeypatch.setattr(database, "DB_FILE", db_file)
+    monkeypatch.setattr(db_pool, "_pool", None)
+    notified = []
+    monkeypatch.setattr(database, "_transfer_listeners",
+                        [lambda user_id, from_account, to_account:
+                         notified.append((user_id, from_account, to_account))])
+    database.init_db()
+    yield notified
+    db_pool.get_pool().close()
+
+
+def _balance(account_number):
+    return load_account("test1", account_number).balance
+
+
+def test_retry_with_the_same_key_returns_the_original_result(bank):
+    legs = [(CHEQUING, SAVING, Decimal("10.00"))]
+    first = transfer_funds_batch("test1", legs, "retry-1")
+    second = transfer_funds_batch("test1", legs, "retry-1")
+
+    assert second == first
+    assert _balance(CHEQUING) == Decimal("99990")
+    assert bank == [("test1", CHEQUING, SAVING)]
+
+
+def test_key_reused_for_other_legs_is_rejected(bank):
+    transfer_funds_batch("test1", [(CHEQUING, SAVING, Decimal("10.00"))], "reuse-1")
+
+    with pytest.raises(ValueError, match="already used"):
+        transfer_funds_batch("test1", [(CHEQUING, SAVING, Decimal("20.00"))], "reuse-1")
+    with pytest.raises(ValueError, match="already used"):
+        transfer_funds_batch("test1", [(CHEQUING, SAVING, Decimal("10.00")),
+                                       (SAVING, CREDIT_CARD, Decimal("1.00"))], "reuse-1")
+    assert _balance(CHEQUING) == Decimal("99990")
+
+
+def test_key_reused_by_another_user_is_rejected(bank):
+    transfer_funds_batch("test1", [(CHEQUING, SAVING, Decimal("10.00"))], "shared-1")
+
+    with pytest.raises(ValueError, match="already used"):
+        transfer_funds_batch("test2", [(CHEQUING, SAVING, Decimal("10.00"))], "shared-1")
+
+
+def test_key_repeated_in_one_group_is_applied_once(bank):
+    legs = [(CHEQUING, SAVING, Decimal("10.00"))]
+    first, second = apply_transfer_group([("test1", legs, "group-1"), ("test1", legs, "group-1")])
+
+    assert second == first
+    assert _balance(CHEQUING) == Decimal("99990")
+    assert bank == [("test1", CHEQUING, SAVING)]
+
+
+def test_failing_request_only_rolls_back_itself(bank):
+    outcomes = apply_transfer_group([
+        ("test1", [(CHEQUING, SAVING, Decimal("10.00"))], None),
+        # The first leg would succeed, the second overdraws the credit card
+        ("test1", [(SAVING, CREDIT_CARD, Decimal("5.00")),
+                   (CREDIT_CARD, CHEQUING, Decimal("1000.00"))], "overdraw-1"),
+        ("test1", [(SAVING, CHEQUING, Decimal("2.00"))], None),
+    ])
+
+    assert isinstance(outcomes[1], ValueError)
+    assert [len(outcome) for outcome in (outcomes[0], outcomes[2])] == [1, 1]
+    assert _balance(CHEQUING) == Decimal("99992")
+    assert _balance(SAVING) == Decimal("100008")
+    assert _balance(CREDIT_CARD) == Decimal("500")
+    assert bank == [("test1", CHEQUING, SAVING), ("test1", SAVING, CHEQUING)]
+    # The failed request recorded nothing under its key, so it can be retried
+    assert database.find_transfers_by_idempotency_key(
+        "test1", "overdraw-1", [(SAVING, CREDIT_CARD, Decimal("5.00"))]) is None